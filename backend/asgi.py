@@ -5,6 +5,15 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
+
+Worker tuning (uvicorn, with DJANGO_SETTINGS_MODULE=backend.production):
+
+    uvicorn backend.asgi:application --workers 4 --timeout-keep-alive 5 \
+        --limit-max-requests 2000 --host 0.0.0.0 --port 8000
+
+All views are synchronous, so each worker runs them in Django's thread pool, one at a time
+per request. Size --workers as for gunicorn in backend/wsgi.py (about one per core), and
+prefer the WSGI entry point unless an ASGI server is required. The same load test applies.
 """
 
 import os
@@ -14,3 +23,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+from evaluation.jobs import start_workers  # noqa: E402  needs the app registry loaded above
+
+start_workers()
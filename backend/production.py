@@ -0,0 +1,64 @@
+"""
+Production settings, for several gunicorn/uvicorn worker processes on one host.
+
+Use with DJANGO_SETTINGS_MODULE=backend.production. Everything shared between workers lives
+in the database or in a cache on the local filesystem, so no external service is needed:
+
+- the default cache is a FileBasedCache under LEGO_CACHE_DIR, so serialized experiments,
+  the auth token (see Config.get_cached) and their invalidations are seen by every worker.
+  Set LEGO_CACHE=database to use an SQLite cache table instead, after
+  `python manage.py createcachetable`.
+- SQLite runs in WAL mode, so readers are not blocked by the single writer, and writers wait
+  for the lock instead of failing with "database is locked".
+
+Request metrics of common.profiling remain per worker. Profiling is off unless LEGO_PROFILING=1,
+and its metrics endpoint then requires the auth token.
+"""
+import os
+
+from backend.settings import *  # noqa: F401,F403
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('LEGO_SECRET_KEY', SECRET_KEY)
+
+ALLOWED_HOSTS = os.environ.get('LEGO_ALLOWED_HOSTS', '*').split(',')
+
+# 生产环境默认关闭性能采集；开启后 /metrics 只接受携带 token 的请求（代理后的来源地址不可信）
+PROFILING_ENABLED = os.environ.get('LEGO_PROFILING') == '1'
+
+PROFILING_METRICS_ALLOWED_IPS = []
+
+DATABASES['default']['OPTIONS'] = {
+    # IMMEDIATE 事务在开始时即获取写锁，避免读后升级写锁时的死锁
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+    ),
+}
+
+CACHE_DIR = os.environ.get('LEGO_CACHE_DIR', BASE_DIR / 'cache')
+
+if os.environ.get('LEGO_CACHE') == 'database':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'lego_cache',
+            'OPTIONS': {
+                'MAX_ENTRIES': 50000,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+            'OPTIONS': {
+                'MAX_ENTRIES': 50000,
+                'CULL_FREQUENCY': 4,
+            },
+        }
+    }
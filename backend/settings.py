@@ -43,9 +43,21 @@ CORS_ALLOW_METHODS = [
 CORS_ALLOW_HEADERS = [
     "Content-Type",
     "Authentication",
+    "Accept",
+    "Content-Encoding",
+    "X-Profile",
+    "If-None-Match",
+    "If-Modified-Since",
     # 如果有其他自定义头，也要加
 ]
 
+CORS_EXPOSE_HEADERS = [
+    "ETag",
+    "Last-Modified",
+    "Age",
+    "X-Snapshot-Created",
+]
+
 
 # Application definition
 
@@ -63,16 +75,49 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'common.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # CORS 之后，解压失败的 4xx 响应也带上 CORS 头
+    'common.middleware.RequestDecompressionMiddleware',
     'django.middleware.common.CommonMiddleware',
     # 'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'smartdjango.middleware.APIPacker'
+    'common.profiling.ProfilingMiddleware',
+    'common.middleware.APIPacker'
+]
+
+# Responses smaller than this many bytes are sent uncompressed, see common.middleware.CompressionMiddleware
+
+COMPRESSION_MIN_SIZE = 1024
+
+# Views accepting gzip/zstd compressed request bodies, see common.middleware.RequestDecompressionMiddleware
+
+REQUEST_DECOMPRESSION_VIEWS = [
+    'evaluation-list',
+    'experiment-list',
+    'experiment-register',
+    'tag-evaluations',
 ]
 
+# The whole decompressed body is held in memory, sized for the largest training log uploads
+REQUEST_MAX_DECOMPRESSED_SIZE = 128 * 1024 * 1024
+
+# Request profiling, see common.profiling.ProfilingMiddleware
+
+PROFILING_ENABLED = False
+
+PROFILING_METRICS_PATH = '/metrics'
+
+# Clients allowed to read the metrics without the auth token. Behind a reverse proxy every request
+# comes from the proxy's address, so keep this empty there and let the scraper send the token.
+
+PROFILING_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+PROFILING_DIR = BASE_DIR / 'profiles'
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -101,9 +146,102 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # 只读分析快照，由 build_analytics_db 命令生成
+    'analytics': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'analytics.sqlite3',
+        'OPTIONS': {
+            'init_command': 'PRAGMA query_only=ON;',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['common.routers.AnalyticsRouter']
+
+# Analytics snapshot, see evaluation.analytics and the build_analytics_db command. Reads of these models
+# by export, report and comparison views go to the ANALYTICS_DATABASE alias once the snapshot exists,
+# so they do not contend with ingestion writes. Set ANALYTICS_DATABASE to None to read the live database.
+
+ANALYTICS_DATABASE = 'analytics'
+
+ANALYTICS_MODELS = [
+    'evaluation.evaluation',
+    'evaluation.experiment',
+    'evaluation.tag',
+    'evaluation.tag_evaluations',
+]
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
     }
 }
 
+# Serialized fragments of completed experiments, see Experiment.jsonl_many
+
+SERIALIZATION_CACHE_TIMEOUT = 7 * 24 * 3600
+
+
+# Experiments without a heartbeat for this many seconds are considered dead
+
+EXPERIMENT_STALE_TIMEOUT = 10 * 60
+
+
+# Leaderboard snapshots, see evaluation.snapshots and the refresh_snapshots command.
+# Only these combinations are stored (requests with a smaller top_k are served from them), any other
+# combination requested through the export API is computed on the fly.
+
+LEADERBOARD_SNAPSHOTS = [
+    dict(replicate=5, metrics=None, datasets=None, top_k=3),
+]
+
+# Seconds to wait after a completed experiment before refreshing, None disables the refresh on completion
+
+SNAPSHOT_REFRESH_DELAY = 30
+
+
+# Log retention, see the archive_logs command. Logs of experiments completed more than
+# LOG_RETENTION_DAYS ago (or already summarized, with LOG_ARCHIVE_SUMMARIZED) move from the database
+# to compressed pack files under LOG_ARCHIVE_DIR, one per month or per evaluation (LOG_ARCHIVE_PACKING).
+
+LOG_ARCHIVE_DIR = BASE_DIR / 'archive'
+
+LOG_RETENTION_DAYS = 30
+
+LOG_ARCHIVE_SUMMARIZED = False
+
+LOG_ARCHIVE_PACKING = 'month'
+
+
+# Background jobs, see evaluation.jobs. Server processes started from backend/wsgi.py or asgi.py
+# run JOB_THREADS worker threads; set it to 0 and run `python manage.py run_jobs --threads N` instead
+# to keep them out of the web workers.
+
+JOB_THREADS = 2
+
+JOB_POLL_INTERVAL = 2
+
+JOB_MAX_ATTEMPTS = 3
+
+JOB_RETRY_DELAY = 30
+
+# Running jobs older than this are considered abandoned by a crashed worker and requeued
+JOB_TIMEOUT = 30 * 60
+
+JOB_RETENTION = 7 * 24 * 3600
+
+# Seconds between two requeue/purge passes of a worker process; they write to the database,
+# so they must not run on every poll
+JOB_MAINTENANCE_INTERVAL = 5 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
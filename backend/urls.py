@@ -15,24 +15,36 @@ Including another URLconf
 """
 from django.urls import path
 from evaluation.views import EvaluationView, ExperimentView, ExperimentRegisterView, LogView, LogSummarizeView, \
-    ExportView
+    ExportView, CompareView, ReportView, ExperimentHeartbeatView, PendingSeedsView, TagView, TagEvaluationsView, \
+    TagLeaderboardView, TagProgressView, TagRunningTimeView, JobView, DuplicatesView, ThroughputView
 
 urlpatterns = [
     # Evaluation URLs
     path('evaluations/', EvaluationView.as_view(), name='evaluation-list'),
     path('evaluations/export', ExportView.as_view(), name='evaluation-export'),
+    path('evaluations/report', ReportView.as_view(), name='evaluation-report'),
+    path('evaluations/compare', CompareView.as_view(), name='evaluation-compare'),
+    path('evaluations/duplicates', DuplicatesView.as_view(), name='evaluation-duplicates'),
+    path('evaluations/throughput', ThroughputView.as_view(), name='evaluation-throughput'),
     path('evaluations/<str:signature>', EvaluationView.as_view(), name='evaluation-detail'),
 
     path('experiments/log', LogView.as_view(), name='experiment-log'),
+    path('experiments/pending', PendingSeedsView.as_view(), name='experiment-pending'),
     path('experiments/<str:session>', ExperimentView.as_view(), name='experiment-info'),
     path('experiments/', ExperimentView.as_view(), name='experiment-list'),
     path('experiments/<str:session>/register', ExperimentRegisterView.as_view(), name='experiment-register'),
+    path('experiments/<str:session>/heartbeat', ExperimentHeartbeatView.as_view(), name='experiment-heartbeat'),
     path('log-summarize', LogSummarizeView.as_view(), name='log-analyse'),
+    path('jobs/', JobView.as_view(), name='job-list'),
+
+    # Tag URLs
+    path('tags/', TagView.as_view(), name='tag-list'),
+    path('tags/<str:name>', TagView.as_view(), name='tag-detail'),
+    path('tags/<str:name>/evaluations', TagEvaluationsView.as_view(), name='tag-evaluations'),
+    path('tags/<str:name>/leaderboard', TagLeaderboardView.as_view(), name='tag-leaderboard'),
+    path('tags/<str:name>/progress', TagProgressView.as_view(), name='tag-progress'),
+    path('tags/<str:name>/running-time', TagRunningTimeView.as_view(), name='tag-running-time'),
 
-    # # Tag URLs
-    # path('tags/', TagView.as_view(), name='tag-list'),
-    # path('tags/<str:name>/', TagView.as_view(), name='tag-detail'),
-    #
     # # Connection URLs
     # path('connections/', ConnectionView.as_view(), name='connection-list'),
 ]
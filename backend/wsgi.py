@@ -5,6 +5,26 @@ It exposes the WSGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
+
+Worker tuning (gunicorn, with DJANGO_SETTINGS_MODULE=backend.production):
+
+    gunicorn backend.wsgi -w 4 --threads 4 --timeout 120 --graceful-timeout 30 \
+        --max-requests 2000 --max-requests-jitter 200 -b 0.0.0.0:8000
+
+- Workers: about one per CPU core. Requests are mostly SQLite reads and JSON encoding, which
+  hold the GIL, so more processes scale reads while threads only overlap I/O.
+- Threads: 2-4 per worker cover clients waiting on uploads and streamed exports.
+- SQLite still allows a single writer. WAL mode and the 20s lock timeout of the production
+  profile queue concurrent completions instead of failing them.
+- Timeout: full exports and live leaderboards on a large database can take tens of seconds.
+- max-requests recycles workers, bounding memory growth from large exports.
+- Every worker runs JOB_THREADS background job threads (log summaries, snapshot refreshes),
+  started below. Do not use --preload, threads started before the fork do not survive it, or
+  set JOB_THREADS = 0 and run `python manage.py run_jobs --threads 2` next to the server.
+
+State shared between workers (cache, auth token) must go through the database or the cache
+configured in backend.production. Validate a configuration with
+`python manage.py loadtest --url http://127.0.0.1:8000 --check-auth`.
 """
 
 import os
@@ -14,3 +34,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+from evaluation.jobs import start_workers  # noqa: E402  needs the app registry loaded above
+
+start_workers()
@@ -10,6 +10,12 @@ class AuthErrors:
     TOKEN = Error('Unauthorized access. Please provide a valid token.', code=Code.Unauthorized)
 
 
+def is_valid_token(token):
+    """Whether the token matches the configured one, always False while no token is configured."""
+    auth = Space.auth
+    return auth is not None and token == auth
+
+
 def require_login(func):
     """
     Decorator to ensure a request is authenticated using a token-based system.
@@ -17,8 +23,7 @@ def require_login(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
         request = analyse.get_request(*args)
-        auth_token = request.META.get('HTTP_AUTHENTICATION')
-        if auth_token != Space.auth:
+        if not is_valid_token(request.META.get('HTTP_AUTHENTICATION')):
             raise AuthErrors.TOKEN
         return func(*args, **kwargs)
 
@@ -0,0 +1,53 @@
+import hashlib
+from functools import wraps
+
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from smartdjango import analyse
+
+from common.middleware import APIPacker, accepts_msgpack
+
+
+def make_etag(*parts):
+    """Weak ETag from version parts, weak because the same version may be encoded differently on the wire."""
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return 'W/' + quote_etag(digest)
+
+
+def conditional(version_getter):
+    """
+    Answers GET requests with 304 Not Modified when the resource version is unchanged.
+
+    `version_getter(request)` returns `(etag, last_modified)` (last_modified may be None) from
+    a cheap timestamp/version lookup, or None to skip. It runs before the view, so unchanged
+    resources are never serialized. Must be placed below the `analyse` decorators.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            request = analyse.get_request(*args)
+            version = version_getter(request)
+            if version is None:
+                return func(*args, **kwargs)
+
+            etag, last_modified = version
+            if accepts_msgpack(request):
+                etag = make_etag(etag, 'msgpack')
+            last_modified = last_modified and int(last_modified.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = func(*args, **kwargs)
+                if not isinstance(response, HttpResponseBase):
+                    response = APIPacker.pack(response, request)
+                if response.status_code != 200:
+                    return response
+
+            response.headers.setdefault('ETag', etag)
+            if last_modified:
+                response.headers.setdefault('Last-Modified', http_date(last_modified))
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        return wrapper
+    return decorator
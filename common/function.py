@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import Optional
 
 
@@ -31,5 +33,42 @@ def argparse(arguments):
     return kwargs
 
 
+def _canonical(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def digest(obj):
+    """Fixed-length digest of a JSON-serializable object, independent of key order and of 5 vs 5.0."""
+    dumped = json.dumps(_canonical(obj), sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(dumped.encode()).hexdigest()
+
+
+def get_command_key(command, ignore=()):
+    """Digest of the script and parsed arguments of a command, so argument order and spacing do not matter."""
+    command = ' '.join(command.split())
+    try:
+        kwargs = argparse(command)
+    except AssertionError:
+        # 无法解析的命令退化为按原文去重
+        return digest(command)
+    for key in ignore:
+        kwargs.pop(key, None)
+    return digest(dict(script=command.split(' ')[:2], arguments=kwargs))
+
+
+def get_configuration_key(configuration):
+    try:
+        configuration = json.loads(configuration)
+    except (TypeError, ValueError):
+        pass
+    return digest(configuration)
+
+
 if __name__ == '__main__':
     print(argparse("python trainer.py --data config/recbench/automotive.yaml --model config/model/dcn_id.yaml --batch_size 5000 --lr 0.001 --lm glove --fast_eval false"))
@@ -0,0 +1,280 @@
+import gzip
+import time
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBase
+from django.utils.cache import patch_vary_headers
+from smartdjango import middleware, OK, Error, Code
+from smartdjango.utils import io
+
+from common.profiling import stats
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+@Error.register
+class RequestErrors:
+    UNSUPPORTED_ENCODING = Error('Unsupported request content encoding', code=Code.UnsupportedMediaType)
+    BODY_TOO_LARGE = Error('Decompressed request body is too large', code=Code.RequestEntityTooLarge)
+    CORRUPTED_BODY = Error('Compressed request body is corrupted', code=Code.BadRequest)
+
+
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+
+def _record(name, value, **labels):
+    if getattr(settings, 'PROFILING_ENABLED', False):
+        stats.increase(name, value, **labels)
+
+
+def accepts_msgpack(request):
+    if msgpack is None or request is None:
+        return False
+    accept = request.META.get('HTTP_ACCEPT', '')
+    return any(media_type in accept for media_type in MSGPACK_TYPES)
+
+
+class APIPacker(middleware.APIPacker):
+    """
+    APIPacker that also lets streaming and file responses through untouched, and encodes
+    the envelope as MessagePack when the client asks for it through `Accept`.
+    """
+    def __call__(self, request, *args, **kwargs):
+        response = self.get_response(request, *args, **kwargs)
+        if isinstance(response, HttpResponseBase):
+            return response
+
+        return self.pack(response, request)
+
+    @classmethod
+    def process_exception(cls, request, error):
+        if isinstance(error, Error):
+            return cls.pack(error, request)
+        return None
+
+    @staticmethod
+    def pack(response, request=None):
+        if isinstance(response, Error):
+            body, error = None, response
+        else:
+            body, error = response, OK
+
+        response = error.json()
+        response['body'] = body
+
+        start = time.perf_counter()
+        if accepts_msgpack(request):
+            encoding = 'msgpack'
+            content = msgpack.packb(response, use_bin_type=True, default=DjangoJSONEncoder().default)
+            content_type = 'application/msgpack'
+        else:
+            encoding = 'json'
+            content = io.json_dumps(response, indent=False)
+            content_type = 'application/json; encoding=utf-8'
+        _record('lego_serialization_seconds_total', time.perf_counter() - start, format=encoding)
+
+        response = HttpResponse(content, status=error.code, content_type=content_type)
+        _record('lego_serialization_bytes_total', len(response.content), format=encoding)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class _GzipCompressor:
+    def __init__(self):
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+class _BrotliCompressor:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=5)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+def get_compressors():
+    compressors = dict()
+    if zstandard is not None:
+        compressors['zstd'] = _ZstdCompressor
+    if brotli is not None:
+        compressors['br'] = _BrotliCompressor
+    compressors['gzip'] = _GzipCompressor
+    return compressors
+
+
+def negotiate_encoding(accept_encoding, compressors):
+    """Picks the best supported coding from an Accept-Encoding header, honouring q-values."""
+    accepted = dict()
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.
+        accepted[coding] = quality
+
+    # compressors 按服务端偏好排序，相同 q 值时取靠前者
+    best, best_quality = None, 0.
+    for coding in compressors:
+        quality = accepted.get(coding, accepted.get('*', 0.))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Negotiated zstd/br/gzip compression of response bodies above COMPRESSION_MIN_SIZE.
+
+    zstd and br are used when the optional zstandard/brotli packages are installed, gzip always
+    works. Streaming responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.compressors = get_compressors()
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding') or response.status_code == 304:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.compressors)
+        if coding is None:
+            return response
+
+        compressor = self.compressors[coding]()
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response.streaming_content, compressor, coding)
+            del response.headers['Content-Length']
+        else:
+            start = time.perf_counter()
+            content = compressor.compress(response.content) + compressor.flush()
+            _record('lego_compression_seconds_total', time.perf_counter() - start, encoding=coding)
+            _record('lego_compression_bytes_in_total', len(response.content), encoding=coding)
+            _record('lego_compression_bytes_out_total', len(content), encoding=coding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = coding
+        return response
+
+    @staticmethod
+    def compress_stream(content, compressor, coding):
+        size_in, size_out = 0, 0
+        for chunk in content:
+            size_in += len(chunk)
+            data = compressor.compress(chunk)
+            if data:
+                size_out += len(data)
+                yield data
+        data = compressor.flush()
+        size_out += len(data)
+        yield data
+        _record('lego_compression_bytes_in_total', size_in, encoding=coding)
+        _record('lego_compression_bytes_out_total', size_out, encoding=coding)
+
+
+class RequestDecompressionMiddleware:
+    """
+    Accepts `Content-Encoding: gzip` or `zstd` request bodies on the views listed in
+    REQUEST_DECOMPRESSION_VIEWS (by URL name).
+
+    The body is decompressed as a stream straight from the socket and rejected once it exceeds
+    REQUEST_MAX_DECOMPRESSED_SIZE, so a small compressed upload cannot expand without bound.
+    """
+    chunk_size = 1 << 16
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'REQUEST_DECOMPRESSION_VIEWS', []))
+        self.max_size = getattr(settings, 'REQUEST_MAX_DECOMPRESSED_SIZE', 1 << 27)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def get_reader(self, coding, stream):
+        if coding in ('gzip', 'x-gzip'):
+            return gzip.GzipFile(fileobj=stream, mode='rb')
+        if coding == 'zstd' and zstandard is not None:
+            return zstandard.ZstdDecompressor().stream_reader(stream)
+        return None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        coding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if not coding or coding == 'identity':
+            return None
+
+        match = request.resolver_match
+        reader = self.get_reader(coding, request) if match and match.url_name in self.views else None
+        if reader is None:
+            return APIPacker.pack(RequestErrors.UNSUPPORTED_ENCODING(details=coding), request)
+
+        chunks, size = [], 0
+        try:
+            while True:
+                chunk = reader.read(self.chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > self.max_size:
+                    return APIPacker.pack(RequestErrors.BODY_TOO_LARGE, request)
+                chunks.append(chunk)
+        except (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard else ()) as err:
+            return APIPacker.pack(RequestErrors.CORRUPTED_BODY(details=err), request)
+
+        request._body = b''.join(chunks)
+        request.META['CONTENT_LENGTH'] = str(size)
+        del request.META['HTTP_CONTENT_ENCODING']
+        return None
@@ -0,0 +1,211 @@
+import cProfile
+import heapq
+import os
+import threading
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+from common.auth import is_valid_token
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class QueryRecorder:
+    """execute_wrapper hook counting queries and their time for a single request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            self.queries.append((elapsed, sql))
+
+
+class RequestStats:
+    """Process-local request aggregates, rendered in the Prometheus text format."""
+
+    def __init__(self, slow_queries=20):
+        self.lock = threading.Lock()
+        self.views = dict()
+        self.counters = dict()
+        self.slow_queries = []
+        self.max_slow_queries = slow_queries
+
+    def record(self, view, method, status, seconds, queries: QueryRecorder, size):
+        with self.lock:
+            stats = self.views.setdefault((view, method), dict(
+                requests=dict(), seconds=0., buckets=[0] * len(BUCKETS),
+                queries=0, query_seconds=0., bytes=0,
+            ))
+            stats['requests'][status] = stats['requests'].get(status, 0) + 1
+            stats['seconds'] += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+            stats['queries'] += queries.count
+            stats['query_seconds'] += queries.seconds
+            stats['bytes'] += size
+
+            for elapsed, sql in queries.queries:
+                item = (elapsed, view, sql)
+                if len(self.slow_queries) < self.max_slow_queries:
+                    heapq.heappush(self.slow_queries, item)
+                elif elapsed > self.slow_queries[0][0]:
+                    heapq.heapreplace(self.slow_queries, item)
+
+    def add_bytes(self, view, method, size):
+        with self.lock:
+            if (view, method) in self.views:
+                self.views[(view, method)]['bytes'] += size
+
+    def increase(self, name, value, **labels):
+        """Adds to a free-form counter, e.g. bytes saved by compression."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @staticmethod
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+    def labels(self, **labels):
+        return ','.join(f'{key}="{self.escape(value)}"' for key, value in labels.items())
+
+    def render(self):
+        lines = [
+            '# TYPE lego_requests_total counter',
+            '# TYPE lego_request_seconds histogram',
+            '# TYPE lego_db_queries_total counter',
+            '# TYPE lego_db_query_seconds_total counter',
+            '# TYPE lego_response_bytes_total counter',
+        ]
+        with self.lock:
+            for (view, method), stats in sorted(self.views.items()):
+                labels = self.labels(view=view, method=method)
+                total = 0
+                for status, count in sorted(stats['requests'].items()):
+                    total += count
+                    lines.append(f'lego_requests_total{{{labels},status="{status}"}} {count}')
+                for bound, count in zip(BUCKETS, stats['buckets']):
+                    lines.append(f'lego_request_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'lego_request_seconds_bucket{{{labels},le="+Inf"}} {total}')
+                lines.append(f'lego_request_seconds_sum{{{labels}}} {stats["seconds"]:.6f}')
+                lines.append(f'lego_request_seconds_count{{{labels}}} {total}')
+                lines.append(f'lego_db_queries_total{{{labels}}} {stats["queries"]}')
+                lines.append(f'lego_db_query_seconds_total{{{labels}}} {stats["query_seconds"]:.6f}')
+                lines.append(f'lego_response_bytes_total{{{labels}}} {stats["bytes"]}')
+
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{name}{{{self.labels(**dict(labels))}}} {value}')
+
+            lines.append('# TYPE lego_slow_query_seconds gauge')
+            for elapsed, view, sql in sorted(self.slow_queries, reverse=True):
+                labels = self.labels(view=view, sql=sql[:300])
+                lines.append(f'lego_slow_query_seconds{{{labels}}} {elapsed:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+stats = RequestStats()
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request instrumentation, enabled with PROFILING_ENABLED.
+
+    Records wall time, database queries and response size per view and serves them at
+    PROFILING_METRICS_PATH to requests carrying the auth token (`Authentication` header or
+    `Authorization: Bearer`), or coming from PROFILING_METRICS_ALLOWED_IPS. Authenticated
+    requests carrying an `X-Profile: 1` header are run under cProfile and dumped to PROFILING_DIR.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.metrics_path = getattr(settings, 'PROFILING_METRICS_PATH', '/metrics')
+        self.profile_dir = getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles')
+        self.allowed_ips = set(getattr(settings, 'PROFILING_METRICS_ALLOWED_IPS', []))
+
+    @staticmethod
+    def is_authenticated(request):
+        token = request.META.get('HTTP_AUTHENTICATION')
+        if token is None:
+            scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+            token = token if scheme.lower() == 'bearer' else None
+        return is_valid_token(token)
+
+    def can_read_metrics(self, request):
+        # 反向代理之后所有请求都来自 127.0.0.1，地址白名单只适合直连部署
+        return request.META.get('REMOTE_ADDR') in self.allowed_ips or self.is_authenticated(request)
+
+    @staticmethod
+    def wants_profile(request):
+        return request.META.get('HTTP_X_PROFILE') == '1' and is_valid_token(request.META.get('HTTP_AUTHENTICATION'))
+
+    def __call__(self, request):
+        if request.path == self.metrics_path:
+            if not self.can_read_metrics(request):
+                return HttpResponse(status=403)
+            return HttpResponse(stats.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile() if self.wants_profile(request) else None
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            if profiler:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler:
+                    profiler.disable()
+        seconds = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        if response.streaming:
+            response.streaming_content = self.count_bytes(response.streaming_content, view, request.method)
+            size = 0
+        else:
+            size = len(response.content)
+        stats.record(view, request.method, response.status_code, seconds, recorder, size)
+
+        response['Server-Timing'] = f'app;dur={seconds * 1000:.1f}, db;dur={recorder.seconds * 1000:.1f}'
+        response['X-DB-Queries'] = str(recorder.count)
+        if profiler:
+            response['X-Profile-Dump'] = self.dump(profiler, view)
+        return response
+
+    @staticmethod
+    def count_bytes(content, view, method):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            stats.add_bytes(view, method, size)
+
+    def dump(self, profiler, view):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        filename = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{view}.prof'
+        path = os.path.join(self.profile_dir, filename)
+        profiler.dump_stats(path)
+        return filename
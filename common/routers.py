@@ -0,0 +1,94 @@
+import contextvars
+import os
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import StreamingHttpResponse
+from smartdjango import analyse
+
+_analytics = contextvars.ContextVar('analytics', default=False)
+
+
+def get_analytics_alias():
+    """The alias of the analytics snapshot, or None while it is disabled or not built yet."""
+    alias = getattr(settings, 'ANALYTICS_DATABASE', None)
+    if not alias or alias not in connections.databases:
+        return None
+    if not os.path.exists(connections.databases[alias]['NAME']):
+        return None
+    return alias
+
+
+def _stream(content):
+    # 流式响应在视图返回后才迭代，每次取块时重新进入分析上下文
+    iterator = iter(content)
+    while True:
+        token = _analytics.set(True)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _analytics.reset(token)
+        yield chunk
+
+
+@contextmanager
+def read_live():
+    """Reads inside the block go to the default database, e.g. existence checks of just created objects."""
+    token = _analytics.set(False)
+    try:
+        yield
+    finally:
+        _analytics.reset(token)
+
+
+def use_analytics(func=None, unless=None):
+    """
+    Sends the reads of ANALYTICS_MODELS made by the view to the read-only analytics snapshot.
+
+    Place it above the `analyse` and `conditional` decorators, so that the version lookup reads
+    the same snapshot. Writes always go to the default database. Requests for which
+    `unless(request)` is true read the live database.
+    """
+    if func is None:
+        return lambda f: use_analytics(f, unless=unless)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if unless is not None and unless(analyse.get_request(*args)):
+            return func(*args, **kwargs)
+
+        token = _analytics.set(True)
+        try:
+            response = func(*args, **kwargs)
+        finally:
+            _analytics.reset(token)
+        if isinstance(response, StreamingHttpResponse):
+            response.streaming_content = _stream(response.streaming_content)
+        return response
+
+    return wrapper
+
+
+class AnalyticsRouter:
+    """Routes reads inside `use_analytics` to the analytics snapshot, everything else to the default database."""
+
+    def db_for_read(self, model, **hints):
+        if _analytics.get() and model._meta.label_lower in settings.ANALYTICS_MODELS:
+            return get_analytics_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 快照是主库的副本，两边的对象可以互相关联
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == getattr(settings, 'ANALYTICS_DATABASE', None):
+            return False
+        return None
@@ -1,10 +1,14 @@
 import pytz
+from django.utils.functional import classproperty
 
 from backend import settings
 from config.models import Config
 
 
 class Space:
-    auth = Config.get('auth')
     tz = pytz.timezone(settings.TIME_ZONE)
 
+    @classproperty
+    def auth(cls):
+        # 每次从共享缓存读取，多进程部署下修改 token 后所有 worker 立即生效
+        return Config.get_cached('auth')
@@ -2,6 +2,7 @@ import warnings
 
 import django.db.utils
 from diq import Dictify
+from django.core.cache import cache
 from django.db import models
 from smartdjango import Error, Code
 
@@ -25,6 +26,33 @@ class Config(models.Model, Dictify):
         except django.db.utils.OperationalError:
             warnings.warn("Database is not ready yet. Please run migrations.")
 
+    @staticmethod
+    def get_cache_key(key):
+        return f'config:{key}'
+
+    @classmethod
+    def get_cached(cls, key):
+        """
+        Value of a key from the shared cache, None if the key does not exist.
+
+        set() and remove() update the cache, so with a cross-process cache backend a change
+        is seen by every worker on its next lookup.
+        """
+        value = cache.get(cls.get_cache_key(key))
+        if value is None:
+            try:
+                value = cls.objects.filter(key=key).values_list('value', flat=True).first()
+            except django.db.utils.OperationalError:
+                warnings.warn("Database is not ready yet. Please run migrations.")
+                return None
+            if value is not None:
+                cache.set(cls.get_cache_key(key), value, timeout=None)
+        return value
+
+    @classmethod
+    def invalidate_cache(cls, key):
+        cache.delete(cls.get_cache_key(key))
+
     @classmethod
     def set(cls, key, value):
         """Set or update the value for a given key."""
@@ -32,12 +60,14 @@ class Config(models.Model, Dictify):
             key=key,
             defaults={"value": value}
         )
+        cache.set(cls.get_cache_key(key), value, timeout=None)
         return obj
 
     @classmethod
     def remove(cls, key):
         config = cls.objects.get(key=key)
         config.delete()
+        cls.invalidate_cache(key)
 
     def json(self):
         """Serialize the config entry as a dictionary."""
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import time
+from urllib.request import pathname2url
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from evaluation.models import Experiment
+
+# 分析查询用不到的大字段，不复制到快照（保留列并置空，ORM 查询不受影响）
+STRIPPED_COLUMNS = {
+    Experiment: ['log'],
+}
+
+
+def get_indexes():
+    experiment = Experiment._meta.db_table
+    return {
+        'analytics_experiment_completed': (experiment, ['is_completed', 'evaluation_id']),
+        'analytics_experiment_summarized': (experiment, ['evaluation_id', 'data_final_time']),
+    }
+
+
+def get_tables():
+    """Tables of ANALYTICS_MODELS, with the M2M tables between them."""
+    return [
+        model._meta.db_table for model in apps.get_models(include_auto_created=True)
+        if model._meta.label_lower in settings.ANALYTICS_MODELS
+    ]
+
+
+def build_snapshot(alias=None):
+    """
+    Builds the read-only analytics snapshot of the default database, returns its size and build time.
+
+    The live database is attached read-only and only the tables of ANALYTICS_MODELS are copied,
+    without the STRIPPED_COLUMNS, in a single read transaction: the state is consistent and the
+    read lock that blocks ingestion commits is only held while the slim columns are copied. The
+    copy is indexed for the export queries and swapped in atomically, so readers see either the
+    old or the new snapshot.
+    """
+    alias = alias or settings.ANALYTICS_DATABASE
+    path = str(connections.databases[alias]['NAME'])
+    tmp = path + '.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    start = time.perf_counter()
+    source = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+    if not source.startswith('file:'):
+        source = f'file:{pathname2url(os.path.abspath(source))}?mode=ro'
+    stripped = {model._meta.db_table: set(columns) for model, columns in STRIPPED_COLUMNS.items()}
+    target = sqlite3.connect(f'file:{pathname2url(os.path.abspath(tmp))}', isolation_level=None, uri=True)
+    try:
+        # 临时文件构建完成前不会被读取，无需日志和同步
+        target.execute('PRAGMA journal_mode=OFF')
+        target.execute('PRAGMA synchronous=OFF')
+        target.execute('ATTACH DATABASE ? AS live', (source,))
+
+        indexes = []
+        target.execute('BEGIN')
+        for table in get_tables():
+            row = target.execute("SELECT sql FROM live.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+            if row is None:
+                continue
+            target.execute(row[0])
+            columns = [
+                f'"{column}"' for _, column, *_ in target.execute(f'PRAGMA live.table_info("{table}")')
+                if column not in stripped.get(table, ())
+            ]
+            columns = ', '.join(columns)
+            target.execute(f'INSERT INTO main."{table}" ({columns}) SELECT {columns} FROM live."{table}"')
+            indexes += [sql for sql, in target.execute(
+                "SELECT sql FROM live.sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,),
+            )]
+        target.execute('COMMIT')
+        target.execute('DETACH DATABASE live')
+
+        for sql in indexes:
+            target.execute(sql)
+        for name, (table, columns) in get_indexes().items():
+            target.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(columns)})')
+        target.execute('ANALYZE')
+    finally:
+        target.close()
+
+    os.replace(tmp, path)
+    # 本进程内已打开的连接仍指向旧文件
+    connections[alias].close()
+    return dict(size=os.path.getsize(path), duration=time.perf_counter() - start)
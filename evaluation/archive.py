@@ -0,0 +1,67 @@
+import json
+import os
+import zlib
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+
+def get_path(name, suffix='.logs'):
+    return os.path.join(settings.LOG_ARCHIVE_DIR, name + suffix)
+
+
+class ArchiveWriter:
+    """
+    Appends logs to pack files under LOG_ARCHIVE_DIR.
+
+    Every log is an independent zlib stream, so it can be read back from its offset and
+    length alone. A sidecar `.idx` file (one JSON line per log) keeps the index recoverable
+    without the database. Call `sync` before recording offsets anywhere.
+    """
+
+    def __init__(self, level=6):
+        self.level = level
+        self.files = dict()
+
+    def open(self, name):
+        if name not in self.files:
+            path = get_path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            pack, index = open(path, 'ab'), open(get_path(name, '.idx'), 'a', encoding='utf-8')
+            if fcntl is not None:
+                # 防止多个归档进程同时追加同一个文件
+                fcntl.flock(pack, fcntl.LOCK_EX)
+            self.files[name] = pack, index
+        return self.files[name]
+
+    def append(self, name, session, log):
+        pack, index = self.open(name)
+        data = zlib.compress(log.encode('utf-8'), self.level)
+        pack.seek(0, os.SEEK_END)
+        offset = pack.tell()
+        pack.write(data)
+        index.write(json.dumps(dict(session=session, offset=offset, length=len(data))) + '\n')
+        return offset, len(data)
+
+    def sync(self):
+        for pack, index in self.files.values():
+            for f in (pack, index):
+                f.flush()
+                os.fsync(f.fileno())
+
+    def close(self):
+        self.sync()
+        for pack, index in self.files.values():
+            pack.close()
+            index.close()
+        self.files = dict()
+
+
+def read(name, offset, length):
+    with open(get_path(name), 'rb') as f:
+        f.seek(offset)
+        return zlib.decompress(f.read(length)).decode('utf-8')
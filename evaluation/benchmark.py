@@ -0,0 +1,290 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils.crypto import get_random_string
+
+from common import handler, function
+from evaluation.export import RANKING_MODELS, MATCHING_MODELS, DATASETS
+from evaluation.models import Evaluation, Experiment
+
+SCALES = {
+    'small': 1_000,
+    'medium': 10_000,
+    'large': 100_000,
+}
+
+METRIC_NAMES = ['GAUC', 'MRR', 'nDCG@1', 'nDCG@5']
+
+
+class SyntheticData:
+    """
+    Generates Legommenders-style evaluations, experiments and training logs.
+
+    Everything is derived from `seed`, so two runs at the same scale produce the same database.
+    """
+
+    def __init__(self, evaluations=1_000, seeds=5, log_epochs=10, log_noise=20, seed=2024):
+        self.evaluations = evaluations
+        self.seeds = seeds
+        self.log_epochs = log_epochs
+        self.log_noise = log_noise
+        self.random = random.Random(seed)
+
+    def command(self, index):
+        models = list(RANKING_MODELS) + list(MATCHING_MODELS)
+        datasets = list(DATASETS)
+        model = models[index % len(models)]
+        dataset = datasets[(index // len(models)) % len(datasets)]
+        lr = [0.001, 0.0005, 0.0001, 0.002][(index // (len(models) * len(datasets))) % 4]
+        lm = ['glove', 'bert', 'llama1', 'null'][index % 4]
+        batch_size = 5000 + index
+        return model, dataset, (
+            f'python trainer.py --data config/recbench/{dataset}.yaml --model config/model/{model}.yaml '
+            f'--batch_size {batch_size} --lr {lr} --lm {lm} --fast_eval false'
+        )
+
+    @staticmethod
+    def configuration(model, dataset):
+        return handler.json_dumps(dict(
+            data=dict(name=f'{dataset}rb'),
+            model=dict(name=model, config=dict(hidden_size=256, num_layers=3)),
+            embed=dict(name='glove'),
+        ))
+
+    def log(self, base):
+        """Returns a training log and the summary fields `Experiment.summarize` would derive from it."""
+        start = datetime(2024, 1, 1) + timedelta(minutes=self.random.randint(0, 10 ** 6))
+        lines = [f'[00:00:00] START TIME: {start:%Y-%m-%d %H:%M:%S.%f}']
+        elapsed = 0
+
+        def stamp():
+            return f'[{elapsed // 3600:02d}:{elapsed % 3600 // 60:02d}:{elapsed % 60:02d}]'
+
+        for _ in range(self.log_noise):
+            elapsed += self.random.randint(0, 3)
+            lines.append(f'{stamp()} |Depots| loading shard {self.random.randint(0, 99)} ...')
+        elapsed += self.random.randint(5, 60)
+        lines.append(f'{stamp()} |Trainer| use single lr: 0.001')
+        prep_time, durations, metrics = elapsed, [], []
+        for epoch in range(self.log_epochs):
+            for step in range(self.log_noise):
+                lines.append(f'{stamp()} |BaseLego| step {step} loss {self.random.random():.4f}')
+            duration = self.random.randint(60, 600)
+            elapsed += duration
+            durations.append(duration)
+            metrics.append(round(base + self.random.random() * 0.02, 4))
+            lines.append(f'{stamp()} |BaseLego| [epoch {epoch}] GAUC {metrics[-1]:.4f}')
+
+        summary = dict(
+            data_start_time=int(start.timestamp()),
+            data_final_time=elapsed,
+            data_prep_time=prep_time,
+            data_total_epochs=len(durations),
+            data_epoch_durations=handler.json_dumps(durations),
+            data_valid_metrics=handler.json_dumps(metrics),
+        )
+        return '\n'.join(lines), summary
+
+    def performance(self, base):
+        return handler.json_dumps({
+            name: round(base / (i + 1) + self.random.random() * 0.01, 4) for i, name in enumerate(METRIC_NAMES)
+        })
+
+    def generate(self, batch_size=1000):
+        for start in range(0, self.evaluations, batch_size):
+            stop = min(start + batch_size, self.evaluations)
+            evaluations = []
+            for index in range(start, stop):
+                model, dataset, command = self.command(index)
+                configuration = self.configuration(model, dataset)
+                evaluations.append(Evaluation(
+                    signature=get_random_string(length=Evaluation.vldt.MAX_SIGNATURE_LENGTH),
+                    command=command,
+                    configuration=configuration,
+                    command_key=function.get_command_key(command),
+                    configuration_key=function.get_configuration_key(configuration),
+                ))
+            evaluations = Evaluation.objects.bulk_create(evaluations)
+
+            experiments = []
+            for evaluation in evaluations:
+                base = 0.6 + self.random.random() * 0.2
+                for seed in range(self.seeds):
+                    log, summary = self.log(base)
+                    experiments.append(Experiment(
+                        evaluation=evaluation,
+                        seed=seed,
+                        session=get_random_string(length=Experiment.vldt.MAX_SESSION_LENGTH),
+                        log=log,
+                        performance=self.performance(base),
+                        is_completed=True,
+                        **summary,
+                    ))
+                # 少量未完成的运行，和真实库一致
+                if self.random.random() < 0.05:
+                    experiments.append(Experiment(
+                        evaluation=evaluation,
+                        seed=self.seeds,
+                        session=get_random_string(length=Experiment.vldt.MAX_SESSION_LENGTH),
+                    ))
+            Experiment.objects.bulk_create(experiments)
+        Experiment.bump_results_version()
+
+
+class Benchmark:
+    """Times endpoints and model methods, recording latency, query count and peak memory."""
+
+    def __init__(self, repeat=5, token='benchmark'):
+        self.repeat = repeat
+        self.client = Client(HTTP_AUTHENTICATION=token)
+        self.results = dict()
+
+    def measure(self, name, func, setup=None):
+        durations, queries = [], []
+        for _ in range(self.repeat):
+            argument = setup() if setup else None
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                func(argument) if setup else func()
+                durations.append(time.perf_counter() - start)
+            queries.append(len(context.captured_queries))
+
+        # 内存单独跑一次，避免 tracemalloc 拖慢计时
+        argument = setup() if setup else None
+        tracemalloc.start()
+        func(argument) if setup else func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        durations.sort()
+        self.results[name] = dict(
+            median_ms=statistics.median(durations) * 1000,
+            p95_ms=durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000,
+            mean_ms=statistics.mean(durations) * 1000,
+            queries=max(queries),
+            peak_kb=peak / 1024,
+        )
+        return self.results[name]
+
+    def request(self, method, path, data=None, **extra):
+        if data is not None:
+            response = getattr(self.client, method)(path, json.dumps(data), content_type='application/json', **extra)
+        else:
+            response = getattr(self.client, method)(path, **extra)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method.upper()} {path} failed with {response.status_code}: {content[:200]}')
+        return content
+
+    def run(self, cases=None):
+        evaluation = Evaluation.objects.order_by('?').first()
+        experiment = Experiment.objects.filter(evaluation=evaluation).first()
+        counter = iter(range(10 ** 9))
+
+        def new_evaluation():
+            index = next(counter)
+            return dict(
+                signature=f'b{index}'[:Evaluation.vldt.MAX_SIGNATURE_LENGTH],
+                command=f'python trainer.py --data config/recbench/bench.yaml --model config/model/bench.yaml --batch_size {index} --lr 0.001 --lm glove',
+                configuration='{}',
+            )
+
+        def new_session():
+            return Experiment.create(evaluation, seed=10 ** 6 + next(counter)).session
+
+        all_cases = {
+            'evaluation_list': lambda: self.measure('evaluation_list', lambda: self.request('get', '/evaluations/?page=2')),
+            'evaluation_detail': lambda: self.measure(
+                'evaluation_detail', lambda: self.request('get', f'/evaluations/{evaluation.signature}')),
+            'experiment_detail': lambda: self.measure(
+                'experiment_detail', lambda: self.request('get', f'/experiments/?session={experiment.session}')),
+            'log': lambda: self.measure('log', lambda: self.request('get', f'/experiments/log?session={experiment.session}')),
+            'export_top_rank': lambda: self.measure(
+                'export_top_rank', lambda: self.request('get', '/evaluations/export?replicate=5&metrics=gauc,mrr&top_k=3&live=1')),
+            'export_top_rank_snapshot': lambda: self.measure(
+                'export_top_rank_snapshot', lambda: self.request('get', '/evaluations/export?replicate=5&metrics=gauc,mrr&top_k=3')),
+            'export_running_hours': lambda: self.measure(
+                'export_running_hours', lambda: self.request('get', '/evaluations/export?scenario=get_total_running_hours')),
+            'summarize': lambda: self.measure('summarize', lambda exp: exp.summarize(), setup=lambda: Experiment.objects.filter(
+                evaluation=evaluation).order_by('?').first()),
+            'create_evaluation': lambda: self.measure(
+                'create_evaluation', lambda data: self.request('post', '/evaluations/', data), setup=new_evaluation),
+            'create_experiment': lambda: self.measure('create_experiment', lambda _: self.request(
+                'post', '/experiments/', dict(signature=evaluation.signature, seed=10 ** 7 + next(counter))), setup=lambda: None),
+            'register': lambda: self.measure('register', lambda session: self.request(
+                'post', f'/experiments/{session}/register', dict(pid=1)), setup=new_session),
+            'complete': lambda: self.measure('complete', lambda session: self.request('put', '/experiments/', dict(
+                session=session, log=experiment.log, performance=experiment.performance)), setup=new_session),
+        }
+
+        for name in cases or all_cases:
+            all_cases[name]()
+        return self.results
+
+    def run_wire(self):
+        evaluation = Evaluation.objects.order_by('?').first()
+        experiment = Experiment.objects.filter(evaluation=evaluation).first()
+        payloads = dict(
+            evaluation_detail=json.loads(self.request('get', f'/evaluations/{evaluation.signature}')),
+            evaluation_list=json.loads(self.request('get', '/evaluations/?page_size=100')),
+            log=json.loads(self.request('get', f'/experiments/log?session={experiment.session}')),
+            export_top_rank=json.loads(self.request('get', '/evaluations/export?replicate=5&metrics=gauc,mrr&top_k=3')),
+        )
+        return measure_wire(payloads, repeat=self.repeat)
+
+
+def measure_wire(payloads, repeat=5):
+    """Bytes and encode CPU time of representative payloads for every wire format and content coding."""
+    from common.middleware import get_compressors, msgpack
+
+    def timed(func, value):
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(value)
+            durations.append(time.perf_counter() - start)
+        return result, statistics.median(durations) * 1000
+
+    encoders = dict(json_pretty=lambda obj: json.dumps(obj, indent=2, ensure_ascii=False).encode())
+    encoders['json'] = lambda obj: json.dumps(obj, ensure_ascii=False).encode()
+    if msgpack is not None:
+        encoders['msgpack'] = lambda obj: msgpack.packb(obj, use_bin_type=True)
+
+    results = dict()
+    for name, payload in payloads.items():
+        results[name] = dict()
+        for encoder_name, encoder in encoders.items():
+            content, encode_ms = timed(encoder, payload)
+            results[name][encoder_name] = dict(bytes=len(content), encode_ms=encode_ms)
+            if encoder_name == 'json_pretty':
+                continue
+            for coding, compressor in get_compressors().items():
+                compressed, compress_ms = timed(lambda data: (lambda c: c.compress(data) + c.flush())(compressor()), content)
+                results[name][f'{encoder_name}+{coding}'] = dict(bytes=len(compressed), encode_ms=encode_ms + compress_ms)
+    return results
+
+
+def compare(current, baseline, threshold=0.2):
+    """Relative change of every case against a previous result file, flagging regressions above `threshold`."""
+    report = dict()
+    for name, result in current['results'].items():
+        if name not in baseline.get('results', {}):
+            continue
+        previous = baseline['results'][name]
+        ratio = result['median_ms'] / previous['median_ms'] if previous['median_ms'] else None
+        report[name] = dict(
+            median_ms=result['median_ms'],
+            baseline_median_ms=previous['median_ms'],
+            ratio=ratio,
+            queries=result['queries'],
+            baseline_queries=previous['queries'],
+            regression=bool(ratio and ratio > 1 + threshold) or result['queries'] > previous['queries'],
+        )
+    return report
@@ -0,0 +1,237 @@
+import math
+import warnings
+
+import numpy as np
+
+from common import handler
+from common.routers import read_live
+from evaluation.models import Evaluation, Experiment
+from evaluation.validators import EvaluationErrors
+
+_lgamma = np.vectorize(math.lgamma, otypes=[float])
+
+
+def _betacf(a, b, x, iterations=200, eps=3e-14):
+    # continued fraction for the regularized incomplete beta (Numerical Recipes), vectorized over inputs
+    tiny = 1e-300
+    qab, qap, qam = a + b, a + 1., a - 1.
+    c = np.ones_like(x)
+    d = 1. - qab * x / qap
+    d = np.where(np.abs(d) < tiny, tiny, d)
+    d = 1. / d
+    h = d.copy()
+    for m in range(1, iterations + 1):
+        m2 = 2 * m
+        aa = m * (b - m) * x / ((qam + m2) * (a + m2))
+        d = 1. + aa * d
+        d = np.where(np.abs(d) < tiny, tiny, d)
+        c = 1. + aa / c
+        c = np.where(np.abs(c) < tiny, tiny, c)
+        d = 1. / d
+        h *= d * c
+        aa = -(a + m) * (qab + m) * x / ((a + m2) * (qap + m2))
+        d = 1. + aa * d
+        d = np.where(np.abs(d) < tiny, tiny, d)
+        c = 1. + aa / c
+        c = np.where(np.abs(c) < tiny, tiny, c)
+        d = 1. / d
+        delta = d * c
+        h *= delta
+        if np.all(np.abs(delta - 1.) < eps):
+            break
+    return h
+
+
+def _betainc(a, b, x):
+    a, b, x = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (a, b, x)))
+    result = np.full(x.shape, np.nan)
+    valid = ~(np.isnan(a) | np.isnan(b) | np.isnan(x))
+    result[valid & (x <= 0)] = 0.
+    result[valid & (x >= 1)] = 1.
+    inner = valid & (x > 0) & (x < 1)
+    if not inner.any():
+        return result
+
+    a, b, x = a[inner], b[inner], x[inner]
+    front = np.exp(_lgamma(a + b) - _lgamma(a) - _lgamma(b) + a * np.log(x) + b * np.log1p(-x))
+    direct = x < (a + 1.) / (a + b + 2.)
+    # 在对称区间内使用 I_x(a, b) = 1 - I_{1-x}(b, a) 保证连分式收敛
+    value = np.where(
+        direct,
+        front * _betacf(a, b, x) / a,
+        1. - front * _betacf(b, a, 1. - x) / b,
+    )
+    result[inner] = value
+    return result
+
+
+def t_two_sided_p(t, df):
+    """Two-sided p-value of Student's t distribution."""
+    t, df = np.asarray(t, dtype=float), np.asarray(df, dtype=float)
+    return _betainc(df / 2., 0.5, df / (df + t * t))
+
+
+def _nan_stats(x):
+    n = np.sum(~np.isnan(x), axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(x, axis=-1) / n
+        var = np.nansum((x - mean[..., None]) ** 2, axis=-1) / (n - 1)
+    mean = np.where(n > 0, mean, np.nan)
+    var = np.where(n > 1, var, np.nan)
+    return n, mean, var
+
+
+def _pack(x):
+    # 将每行有效值左移，便于按有效个数重采样
+    order = np.argsort(np.isnan(x), axis=-1, kind='stable')
+    return np.take_along_axis(x, order, axis=-1), np.sum(~np.isnan(x), axis=-1)
+
+
+def _bootstrap_means(packed, n, rng, n_boot, chunk=200):
+    size = packed.shape[-1]
+    positions = np.arange(size)
+    mask = positions < n[..., None]
+    means = []
+    for start in range(0, n_boot, chunk):
+        b = min(chunk, n_boot - start)
+        index = np.floor(rng.random((b,) + packed.shape) * np.maximum(n, 1)[..., None]).astype(int)
+        samples = np.take_along_axis(np.broadcast_to(packed, (b,) + packed.shape), index, axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means.append(np.where(mask, samples, 0.).sum(axis=-1) / n)
+    return np.concatenate(means, axis=0)
+
+
+def compare_arrays(baseline, candidates, n_boot=1000, confidence=0.95, seed=0):
+    """
+    Compares candidates against a baseline across seeds.
+
+    baseline: (metrics, seeds), candidates: (candidates, metrics, seeds), missing runs are NaN.
+    Seeds are aligned by column, so paired statistics only use seeds both sides completed.
+    """
+    rng = np.random.default_rng(seed)
+    base = np.broadcast_to(baseline, candidates.shape)
+
+    n_b, mean_b, var_b = _nan_stats(base)
+    n_c, mean_c, var_c = _nan_stats(candidates)
+
+    # paired: seed-matched differences
+    paired = np.where(np.isnan(base) | np.isnan(candidates), np.nan, candidates - base)
+    n_p, mean_p, var_p = _nan_stats(paired)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sd_p = np.sqrt(var_p)
+        t_p = mean_p / (sd_p / np.sqrt(n_p))
+        df_p = np.where(n_p > 1, n_p - 1., np.nan)
+
+        # unpaired: Welch's t-test
+        se_b, se_c = var_b / n_b, var_c / n_c
+        t_u = (mean_c - mean_b) / np.sqrt(se_b + se_c)
+        df_u = (se_b + se_c) ** 2 / (se_b ** 2 / (n_b - 1) + se_c ** 2 / (n_c - 1))
+
+        pooled = np.sqrt(((n_b - 1) * var_b + (n_c - 1) * var_c) / (n_b + n_c - 2))
+        cohen_d = (mean_c - mean_b) / pooled
+        d_z = mean_p / sd_p
+
+    alpha = (1 - confidence) / 2
+    quantiles = [alpha, 1 - alpha]
+
+    packed_p, count_p = _pack(paired)
+    boot_p = _bootstrap_means(packed_p, count_p, rng, n_boot)
+    packed_b, count_b = _pack(base)
+    packed_c, count_c = _pack(candidates)
+    boot_u = _bootstrap_means(packed_c, count_c, rng, n_boot) - _bootstrap_means(packed_b, count_b, rng, n_boot)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        ci_p = np.nanquantile(boot_p, quantiles, axis=0)
+        ci_u = np.nanquantile(boot_u, quantiles, axis=0)
+    ci_p = np.where(n_p > 0, ci_p, np.nan)
+    ci_u = np.where((n_b > 0) & (n_c > 0), ci_u, np.nan)
+
+    return dict(
+        baseline=dict(n=n_b, mean=mean_b, std=np.sqrt(var_b)),
+        candidate=dict(n=n_c, mean=mean_c, std=np.sqrt(var_c)),
+        difference=mean_c - mean_b,
+        paired=dict(n=n_p, mean=mean_p, t=t_p, df=df_p, p=t_two_sided_p(t_p, df_p), ci=ci_p),
+        unpaired=dict(t=t_u, df=df_u, p=t_two_sided_p(t_u, df_u), ci=ci_u),
+        effect_size=dict(cohen_d=cohen_d, d_z=d_z),
+    )
+
+
+def _number(value):
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _pick(stats, index):
+    if isinstance(stats, dict):
+        return {key: _pick(value, index) for key, value in stats.items()}
+    if stats.ndim > len(index):
+        return [_number(v) for v in stats[(slice(None),) + index]]
+    return _number(stats[index])
+
+
+def get_performance_matrix(signatures, metrics=None):
+    """Loads completed experiment performance of the signatures as a (signatures, metrics, seeds) array."""
+    with read_live():
+        found = set(Evaluation.objects.filter(signature__in=signatures).values_list('signature', flat=True))
+    for signature in signatures:
+        if signature not in found:
+            raise EvaluationErrors.EVALUATION_NOT_FOUND(details=signature)
+
+    records = dict()
+    seeds = set()
+    for signature, seed, performance in Experiment.objects.filter(
+        evaluation__signature__in=signatures,
+        is_completed=True,
+    ).values_list('evaluation__signature', 'seed', 'performance').iterator():
+        if not performance:
+            continue
+        performance = {k.lower(): v for k, v in handler.json_loads(performance).items()}
+        records[(signature, seed)] = performance
+        seeds.add(seed)
+
+    if metrics is None:
+        metrics = []
+        for (signature, _), performance in records.items():
+            if signature == signatures[0]:
+                metrics.extend(m for m in performance if m not in metrics)
+
+    seeds = sorted(seeds)
+    seed_index = {seed: i for i, seed in enumerate(seeds)}
+    signature_index = {signature: i for i, signature in enumerate(signatures)}
+    matrix = np.full((len(signatures), len(metrics), len(seeds)), np.nan)
+    for (signature, seed), performance in records.items():
+        for j, metric in enumerate(metrics):
+            if metric in performance:
+                matrix[signature_index[signature], j, seed_index[seed]] = performance[metric]
+    return matrix, metrics, seeds
+
+
+def compare_evaluations(signatures, metrics=None, n_boot=1000, confidence=0.95, seed=0):
+    """Compares every signature after the first against the first one (the baseline)."""
+    if len(signatures) < 2:
+        raise EvaluationErrors.COMPARISON_TOO_FEW
+    duplicates = sorted({signature for signature in signatures if signatures.count(signature) > 1})
+    if duplicates:
+        raise EvaluationErrors.COMPARISON_DUPLICATE(details=','.join(duplicates))
+    metrics = metrics and [metric.lower() for metric in metrics]
+
+    matrix, metrics, seeds = get_performance_matrix(signatures, metrics)
+    stats = compare_arrays(matrix[0], matrix[1:], n_boot=n_boot, confidence=confidence, seed=seed)
+
+    comparisons = []
+    for i, signature in enumerate(signatures[1:]):
+        comparisons.append(dict(
+            signature=signature,
+            metrics={metric: _pick(stats, (i, j)) for j, metric in enumerate(metrics)},
+        ))
+
+    return dict(
+        baseline=signatures[0],
+        metrics=metrics,
+        seeds=seeds,
+        confidence=confidence,
+        comparisons=comparisons,
+    )
@@ -0,0 +1,32 @@
+from itertools import groupby
+
+from django.db.models import Count
+
+from common import function
+from evaluation.models import Evaluation
+
+
+def find_duplicates(evaluations=None, ignore=(), chunk_size=2000):
+    """
+    Groups of near-duplicate evaluations, each a dict of reason, digest and signatures.
+
+    - configuration: identical configurations (by digest) registered under different commands
+    - command: commands identical once the `ignore` arguments are dropped, e.g. fast_eval
+    """
+    evaluations = Evaluation.objects.all() if evaluations is None else evaluations
+    groups = []
+
+    keys = evaluations.values('configuration_key').annotate(count=Count('pk')).filter(count__gt=1).values('configuration_key')
+    duplicated = evaluations.filter(configuration_key__in=keys).exclude(configuration_key='').order_by(
+        'configuration_key', 'pk',
+    ).values_list('configuration_key', 'signature')
+    for key, items in groupby(duplicated.iterator(chunk_size=chunk_size), key=lambda item: item[0]):
+        groups.append(dict(reason='configuration', digest=key, signatures=[signature for _, signature in items]))
+
+    commands = dict()
+    for signature, command in evaluations.order_by('pk').values_list('signature', 'command').iterator(chunk_size=chunk_size):
+        commands.setdefault(function.get_command_key(command, ignore=ignore), []).append(signature)
+    for key, signatures in commands.items():
+        if len(signatures) > 1:
+            groups.append(dict(reason='command', digest=key, signatures=signatures))
+    return groups
@@ -0,0 +1,248 @@
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, date
+
+import django
+from django.core.management.color import no_style
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
+
+from evaluation import archive
+from evaluation.models import Evaluation, Experiment, Tag
+from evaluation.renderers import get_renderer, pyarrow
+
+# 按外键依赖排序，恢复时依次导入
+TABLES = {
+    'evaluation': Evaluation,
+    'tag': Tag,
+    'tag_evaluations': Tag.evaluations.through,
+    'experiment': Experiment,
+}
+
+EXTENSIONS = dict(ndjson='ndjson.gz', parquet='parquet')
+
+MANIFEST = 'manifest.json'
+RESTORE_STATE = 'restore.json'
+
+
+# 日志及其归档位置：不导出日志时一并去掉，否则恢复后的记录指向目标机器上不存在的打包文件
+LOG_COLUMNS = ('log', 'log_archive', 'log_offset', 'log_length')
+
+
+def get_columns(model, logs=False):
+    return [field.attname for field in model._meta.concrete_fields if logs or field.attname not in LOG_COLUMNS]
+
+
+def get_types(model, columns):
+    types = dict()
+    for field in model._meta.concrete_fields:
+        if field.attname not in columns:
+            continue
+        if isinstance(field, models.BooleanField):
+            types[field.attname] = 'bool'
+        elif isinstance(field, (models.IntegerField, models.AutoField, models.ForeignKey)):
+            types[field.attname] = 'int'
+        elif isinstance(field, models.FloatField):
+            types[field.attname] = 'float'
+        else:
+            types[field.attname] = 'str'
+    return types
+
+
+def save_json(obj, path):
+    """Writes through a temporary file, so an interrupted run never leaves a truncated file."""
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=2, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+
+
+def plan_partitions(model, partition_size):
+    """Primary key ranges [start, end) of about `partition_size` rows each, end None for the last."""
+    starts = []
+    for index, pk in enumerate(model.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=10000)):
+        if index % partition_size == 0:
+            starts.append(pk)
+    ends = starts[1:] + [None]
+    return [dict(index=index, start=start, end=end) for index, (start, end) in enumerate(zip(starts, ends))]
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _init_worker():
+    # fork 出的子进程不能复用父进程的数据库连接
+    django.setup()
+    connections.close_all()
+
+
+def dump_partition(table, partition, directory, export_format, logs, chunk_size=2000):
+    model = TABLES[table]
+    columns = get_columns(model, logs)
+    rows = model.objects.filter(pk__gte=partition['start']).order_by('pk')
+    if partition['end'] is not None:
+        rows = rows.filter(pk__lt=partition['end'])
+
+    count = 0
+    # 带日志导出时把已归档的日志读回，使导出文件不依赖归档目录
+    inline = logs and 'log_archive' in columns
+    if inline:
+        log, name, offset, length = (columns.index(column) for column in LOG_COLUMNS)
+
+    def iter_rows():
+        nonlocal count
+        for row in rows.values_list(*columns).iterator(chunk_size=chunk_size):
+            count += 1
+            row = [_serialize(value) for value in row]
+            if inline and row[log] is None and row[name]:
+                row[log] = archive.read(row[name], row[offset], row[length])
+                row[name], row[offset], row[length] = '', None, None
+            yield row
+
+    filename = os.path.join(table, f'{partition["index"]:05d}.{EXTENSIONS[export_format]}')
+    path = os.path.join(directory, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    renderer = get_renderer(export_format, columns, types=get_types(model, columns), batch_size=chunk_size)
+    with (gzip.open(path + '.tmp', 'wt', encoding='utf-8') if export_format == 'ndjson' else open(path + '.tmp', 'wb')) as f:
+        for chunk in renderer.render(iter_rows()):
+            f.write(chunk)
+    os.replace(path + '.tmp', path)
+    return dict(partition, file=filename, rows=count, bytes=os.path.getsize(path))
+
+
+def dump(directory, export_format='ndjson', logs=False, workers=4, partition_size=20000, callback=None):
+    """
+    Dumps evaluations, tags and experiments (with summaries, logs optional) as partitions.
+    Archived logs are read back from the cold tier, so a dump with logs is self-contained.
+
+    Partitions are written by `workers` processes. The manifest records the partition plan and
+    every finished partition, so an interrupted dump resumes where it stopped.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['format'] != export_format or manifest['logs'] != logs:
+            raise ValueError(f'{directory} holds a {manifest["format"]} dump with logs={manifest["logs"]}')
+    else:
+        manifest = dict(
+            format=export_format,
+            logs=logs,
+            created_at=timezone.now().isoformat(),
+            tables={table: dict(
+                columns=get_columns(model, logs),
+                partitions=plan_partitions(model, partition_size),
+            ) for table, model in TABLES.items()},
+        )
+        save_json(manifest, manifest_path)
+
+    pending = [
+        (table, partition)
+        for table, info in manifest['tables'].items()
+        for partition in info['partitions']
+        if 'file' not in partition or not os.path.exists(os.path.join(directory, partition['file']))
+    ]
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(dump_partition, table, partition, directory, export_format, logs): table
+            for table, partition in pending
+        }
+        for future in as_completed(futures):
+            table, result = futures[future], future.result()
+            partitions = manifest['tables'][table]['partitions']
+            partitions[result['index']] = result
+            save_json(manifest, manifest_path)
+            if callback:
+                callback(table, result)
+    return manifest
+
+
+def read_partition(path, export_format, columns, batch_size):
+    if export_format == 'ndjson':
+        batch = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                batch.append(json.loads(line))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+        return
+
+    if pyarrow is None:
+        raise RuntimeError('Restoring parquet dumps requires pyarrow')
+    for record_batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+        yield record_batch.to_pylist()
+
+
+@contextmanager
+def preserve_timestamps(model):
+    """Turns off auto_now/auto_now_add while restoring, bulk_create would otherwise overwrite them."""
+    fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    flags = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, flags):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def load(directory, batch_size=2000, ignore_conflicts=False, callback=None):
+    """
+    Restores a dump with batched bulk_create, one transaction per partition.
+
+    Restored partitions are recorded next to the manifest, so an interrupted restore resumes.
+    Primary keys are kept, the target tables are expected to be empty.
+    """
+    with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+    state_path = os.path.join(directory, RESTORE_STATE)
+    state = dict(database=str(connection.settings_dict['NAME']), restored=[])
+    if os.path.exists(state_path):
+        with open(state_path, encoding='utf-8') as f:
+            previous = json.load(f)
+        if previous['database'] == state['database']:
+            state = previous
+    restored = set(state['restored'])
+
+    for table, model in TABLES.items():
+        info = manifest['tables'][table]
+        with preserve_timestamps(model):
+            for partition in info['partitions']:
+                if 'file' not in partition:
+                    raise ValueError(f'Partition {partition["index"]} of {table} was not dumped, resume the dump first')
+                if partition['file'] in restored:
+                    continue
+                count = 0
+                with transaction.atomic():
+                    for batch in read_partition(
+                        os.path.join(directory, partition['file']), manifest['format'], info['columns'], batch_size,
+                    ):
+                        model.objects.bulk_create(
+                            [model(**row) for row in batch], batch_size=batch_size, ignore_conflicts=ignore_conflicts,
+                        )
+                        count += len(batch)
+                restored.add(partition['file'])
+                state['restored'].append(partition['file'])
+                save_json(state, state_path)
+                if callback:
+                    callback(table, partition, count)
+
+    # 显式写入主键后需要重置自增序列（PostgreSQL 等）
+    statements = connection.ops.sequence_reset_sql(no_style(), list(TABLES.values()))
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    Experiment.bump_results_version()
+    return manifest
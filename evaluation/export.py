@@ -1,6 +1,13 @@
+import heapq
+import itertools
+
+import numpy as np
+from django.db.models import Sum, F
 from oba import Obj
 
+from common import handler
 from evaluation.models import Evaluation, Experiment
+from evaluation.renderers import LaTeXRenderer
 
 RANKING_MODELS = {
     'dnn': 'DNN',
@@ -60,84 +67,252 @@ METRICS = {
 
 
 def get_total_running_hours():
-    running_seconds = 0
-    for experiment in Experiment.objects.all():
-        running_seconds += experiment.data_final_time - experiment.data_prep_time
-    return running_seconds / 3600
-
-
-def get_top_rank_models_per_datasets(replicate=5, metrics=None, datasets=None, top_k=1, return_table=False):
-
-    def get_pretty_table(results, metrics, top_k):
-        table_lines = []
-        readable_rank = ['SOTA', 'Runner-up']
-        for i in range(1, top_k):
-            readable_rank.append(f'Rank-{i + 1}')
-        num_columns_per_rank = len(metrics) + 1
-        current_line = ['Dataset']
-        for i in range(top_k):
-            current_line.append("\\multicolumn{%s}{c}{%s}" % (num_columns_per_rank, readable_rank[i]))
-        table_lines.append(current_line)
-        table_lines.append([''] + ['Model', *metrics] * top_k)
+    running_seconds = Experiment.objects.filter(
+        data_final_time__isnull=False,
+        data_prep_time__isnull=False,
+    ).aggregate(seconds=Sum(F('data_final_time') - F('data_prep_time')))['seconds']
+    return (running_seconds or 0) / 3600
+
+
+def get_top_rank_table(results, metrics, top_k):
+    """Header lines and rows of the paper table, ranks side by side per dataset."""
+    readable_rank = ['SOTA', 'Runner-up']
+    for i in range(1, top_k):
+        readable_rank.append(f'Rank-{i + 1}')
+    num_columns_per_rank = len(metrics) + 1
+    header = [
+        ['Dataset'] + ["\\multicolumn{%s}{c}{%s}" % (num_columns_per_rank, readable_rank[i]) for i in range(top_k)],
+        [''] + ['Model', *metrics] * top_k,
+    ]
 
+    def rows():
         for dataset in results:
             dataset_results = results[dataset]
-            dataset = DATASETS.get(dataset, dataset)
-            current_line = [dataset]
+            current_line = [DATASETS.get(dataset, dataset)]
             for i in range(top_k):
                 current_line.append(dataset_results[i]['model'])
                 for metric in metrics:
                     mean, std = dataset_results[i][metric.upper()]
-                    current_line.append(f'{mean * 100:.2f} $\pm$ {std * 100:.2f}')
-            table_lines.append(current_line)
+                    current_line.append(f'{mean * 100:.2f} $\\pm$ {std * 100:.2f}')
+            yield current_line
 
-        for index, line in enumerate(table_lines):
-            table_lines[index] = ' & '.join(line) + ' \\\\'
-        return '\n'.join(table_lines)
+    return header, rows()
 
-    top_ranks = dict()
+
+def get_top_rank_rows(results, metrics):
+    """Flattens top-rank results into (dataset, rank, model, metric mean/std...) rows."""
+    metrics = list(metrics)
+    columns = ['dataset', 'rank', 'model']
+    for metric in metrics:
+        columns.extend([f'{metric}_mean', f'{metric}_std'])
+
+    def rows():
+        for dataset in results:
+            for rank, entry in enumerate(results[dataset], start=1):
+                performance = {k.lower(): v for k, v in entry.items() if k != 'model'}
+                row = [dataset, rank, entry['model']]
+                for metric in metrics:
+                    mean, std = performance.get(metric, (None, None))
+                    row.extend([None if mean is None else float(mean), None if std is None else float(std)])
+                yield row
+
+    types = dict(dataset='str', rank='int', model='str')
+    types.update({column: 'float' for column in columns[3:]})
+    return columns, rows(), types
+
+
+def get_results(replicate=1, metrics=None, datasets=None, chunk_size=2000):
+    """
+    Row-oriented result set for offline analysis, one row per completed experiment.
+
+    Rows are produced lazily from a server-side cursor, grouped per evaluation only to
+    apply the replicate threshold.
+    """
+    metrics = list(metrics or METRICS)
+    columns = ['signature', 'model', 'dataset', 'lm', 'lr', 'batch_size', 'seed', *metrics]
+
+    def flush(group):
+        if not group or len(group) < replicate:
+            return
+        params = Evaluation.parse_params(group[0][1])
+        if datasets and params['data'].lower() not in datasets:
+            return
+        for signature, _, seed, performance in group:
+            performance = {k.lower(): v for k, v in handler.json_loads(performance or '{}').items()}
+            yield [
+                signature, params['model'], params['data'], params['lm'], params['lr'], params['batch_size'], seed,
+                *[performance.get(metric) for metric in metrics],
+            ]
+
+    def rows():
+        experiments = Experiment.objects.filter(is_completed=True).order_by('evaluation_id', 'seed').values_list(
+            'evaluation_id', 'evaluation__signature', 'evaluation__command', 'seed', 'performance',
+        )
+        current, group = None, []
+        for evaluation_id, *values in experiments.iterator(chunk_size=chunk_size):
+            if evaluation_id != current:
+                yield from flush(group)
+                current, group = evaluation_id, []
+            group.append(values)
+        yield from flush(group)
+
+    types = dict(signature='str', model='str', dataset='str', lm='str', seed='int')
+    types.update({metric: 'float' for metric in metrics})
+    return columns, rows(), types
+
+
+class TopK:
+    """
+    Bounded min-heap keeping the `k` largest entries by key, in O(k) memory.
+
+    Among equal keys the entry pushed first ranks higher. With `with_ties`, entries tied with
+    the k-th are kept as well. Entries pushed with a `unique` value are deduplicated on it,
+    only the best entry per value is kept.
+    """
+
+    def __init__(self, k, with_ties=False):
+        self.k = k
+        self.with_ties = with_ties
+        self.heap = []
+        self.ties = []
+        self.members = dict()
+        self.counter = itertools.count()
+
+    def push(self, key, item, unique=None):
+        entry = (key, -next(self.counter), unique, item)
+        if unique is not None and unique in self.members:
+            current = self.members[unique]
+            if current[:2] >= entry[:2]:
+                return
+            self.heap.remove(current)
+            heapq.heapify(self.heap)
+            heapq.heappush(self.heap, entry)
+            self.members[unique] = entry
+            if self.with_ties:
+                # 替换后堆顶可能上移，不再与之相等的并列项以及该 unique 的旧并列项都要移除
+                self._filter_ties(lambda tie: tie[2] != unique)
+            return
+
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+            self._register(entry)
+            return
+
+        if entry[:2] < self.heap[0][:2]:
+            if self.with_ties and key == self.heap[0][0]:
+                self.ties.append(entry)
+            return
+
+        evicted = heapq.heapreplace(self.heap, entry)
+        self._register(entry)
+        self.members.pop(evicted[2], None)
+        if self.with_ties:
+            self.ties.append(evicted)
+            self._filter_ties()
+
+    def _filter_ties(self, keep=None):
+        self.ties = [tie for tie in self.ties if tie[0] == self.heap[0][0] and (keep is None or keep(tie))]
+
+    def _register(self, entry):
+        if entry[2] is not None:
+            self.members[entry[2]] = entry
+
+    def items(self):
+        entries = sorted(self.heap, reverse=True)
+        seen = set(self.members)
+        for entry in sorted(self.ties, reverse=True):
+            if entry[2] is None or entry[2] not in seen:
+                seen.add(entry[2])
+                entries.append(entry)
+        return [entry[3] for entry in entries]
+
+
+def get_rank_score(performances, metrics, tiebreak=None):
+    """
+    Ranking key of an evaluation: mean of all `metrics` over its runs, 0 when a run misses one,
+    followed by the mean of every `tiebreak` metric.
+    """
+    values = []
+    for performance in performances:
+        for metric in metrics:
+            if metric not in performance:
+                values = None
+                break
+            values.append(performance[metric])
+        if values is None:
+            break
+    score = sum(values) / len(values) if values else 0
+
+    secondary = []
+    for metric in tiebreak or []:
+        metric_values = [performance[metric] for performance in performances if metric in performance]
+        secondary.append(sum(metric_values) / len(metric_values) if metric_values else float('-inf'))
+    return (score, *secondary)
+
+
+def get_performance_stats(performances, metrics):
+    """(mean, std) per metric, keeping the metric names as reported by the runs."""
+    values = dict()
+    for performance in performances:
+        for metric, value in performance.items():
+            if metric.lower() in metrics:
+                values.setdefault(metric, []).append(value)
+    return {metric: (np.mean(metric_values), np.std(metric_values, ddof=1)) for metric, metric_values in values.items()}
+
+
+def get_top_rank_models_per_datasets(replicate=5, metrics=None, datasets=None, top_k=1, return_table=False,
+                                     tiebreak=None, per_model=False, with_ties=False, chunk_size=2000):
+    """
+    Best `top_k` evaluations per dataset, ranked by the mean of `metrics` over their runs.
+
+    Completed experiments are streamed once, grouped per evaluation and pushed into one bounded
+    heap per dataset, so memory stays within top_k x datasets. `tiebreak` metrics order
+    evaluations with equal scores, `per_model` keeps only the best configuration of each model,
+    and `with_ties` also returns evaluations tied with the last rank.
+    """
     metrics = metrics or METRICS
     datasets = datasets or DATASETS
+    tiebreak = [metric.lower() for metric in tiebreak or []]
+    top_ranks = dict()
 
-    for evaluation in Evaluation.objects.all():
-        experiments = Experiment.objects.filter(evaluation=evaluation, is_completed=True)
-        if experiments.count() < replicate:
-            continue
+    def flush(group):
+        if not group or len(group) < replicate:
+            return
 
-        config = Obj(evaluation.prettify_configuration())
+        config = Obj(handler.json_loads(group[0][0]))
         dataset = config.data.name.lower().replace('rb', '')
-
         if dataset not in datasets:
-            continue
+            return
+
+        performances = [handler.json_loads(performance) if performance else {} for _, performance in group]
+        lowered = [{k.lower(): v for k, v in performance.items()} for performance in performances]
+        model = config.model.name.lower()
+        if model in MODELS:
+            model = MODELS[model]
 
         if dataset not in top_ranks:
-            top_ranks[dataset] = []
-
-        score = evaluation.export_rank_performance(metrics=metrics)
-        top_ranks[dataset].append((evaluation, score))
-
-    results = dict()
-
-    for dataset in top_ranks:
-        top_ranks[dataset].sort(key=lambda x: x[1], reverse=True)
-        top_ranks[dataset] = top_ranks[dataset][:top_k]
-        results[dataset] = []
-
-        for evaluation, _ in top_ranks[dataset]:
-            config = Obj(evaluation.prettify_configuration())
-            model = config.model.name.lower()
-            if model in MODELS:
-                model = MODELS[model]
-            # tune_from = config.model.config.item_config.tune_from or ''
-            # embed = config.embed.name or 'null'
-            # lm = config.lm
-            # model = f'{model}'
-            results[dataset].append(dict(
-                model=model,
-                **evaluation.prettify_performance(metrics=metrics),
-            ))
+            top_ranks[dataset] = TopK(top_k, with_ties=with_ties)
+        top_ranks[dataset].push(
+            get_rank_score(lowered, metrics, tiebreak),
+            dict(model=model, **get_performance_stats(performances, metrics)),
+            unique=model if per_model else None,
+        )
+
+    experiments = Experiment.objects.filter(is_completed=True).order_by('evaluation_id').values_list(
+        'evaluation_id', 'evaluation__configuration', 'performance',
+    )
+    current, group = None, []
+    for evaluation_id, *values in experiments.iterator(chunk_size=chunk_size):
+        if evaluation_id != current:
+            flush(group)
+            current, group = evaluation_id, []
+        group.append(values)
+    flush(group)
+
+    results = {dataset: top_rank.items() for dataset, top_rank in top_ranks.items()}
 
     if return_table:
-        return get_pretty_table(results, metrics, top_k)
+        header, rows = get_top_rank_table(results, metrics, top_k)
+        return LaTeXRenderer(header[-1], header=header).render_to_string(rows)
 
     return results
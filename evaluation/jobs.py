@@ -0,0 +1,104 @@
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connections
+
+from evaluation.models import Experiment, Job
+from evaluation.snapshots import refresh_snapshots
+
+HANDLERS = dict()
+
+
+def handler(kind):
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+@handler(Job.SUMMARIZE)
+def summarize(session):
+    Experiment.get_by_session(session).summarize()
+
+
+@handler(Job.REFRESH_SNAPSHOTS)
+def refresh(_):
+    refresh_snapshots()
+
+
+def execute(job):
+    try:
+        HANDLERS[job.kind](job.target)
+    except Exception:
+        job.fail(traceback.format_exc())
+        return False
+    job.succeed()
+    return True
+
+
+def run_pending(limit=None):
+    """Runs due jobs until the queue is empty or `limit` jobs have run, returns the number run."""
+    count = 0
+    while limit is None or count < limit:
+        job = Job.claim()
+        if job is None:
+            break
+        execute(job)
+        count += 1
+    return count
+
+
+class JobQueue:
+    """Worker threads polling the job table, woken immediately by jobs enqueued in this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.threads = []
+        self.stopped = threading.Event()
+        self.maintained_at = None
+
+    def start(self, threads=None):
+        threads = settings.JOB_THREADS if threads is None else threads
+        with self.lock:
+            while len(self.threads) < threads:
+                thread = threading.Thread(target=self.work, name=f'job-worker-{len(self.threads)}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def stop(self):
+        self.stopped.set()
+        Job.wakeup.set()
+
+    def maintain(self):
+        """Requeues stale jobs at most once per JOB_MAINTENANCE_INTERVAL for all threads of the process."""
+        with self.lock:
+            now = time.monotonic()
+            if self.maintained_at is not None and now - self.maintained_at < settings.JOB_MAINTENANCE_INTERVAL:
+                return
+            self.maintained_at = now
+        Job.requeue_stale()
+
+    def work(self):
+        while not self.stopped.is_set():
+            try:
+                self.maintain()
+                processed = run_pending()
+            except Exception:
+                traceback.print_exc()
+                processed = 0
+            finally:
+                connections.close_all()
+            if not processed:
+                Job.wakeup.wait(settings.JOB_POLL_INTERVAL)
+                Job.wakeup.clear()
+
+
+queue = JobQueue()
+
+
+def start_workers():
+    """Starts the in-process workers of a server process, see JOB_THREADS."""
+    if settings.JOB_THREADS:
+        queue.start()
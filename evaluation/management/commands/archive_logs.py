@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from evaluation.models import Experiment
+
+
+class Command(BaseCommand):
+    help = 'Moves logs of old or summarized experiments from the database to compressed archive files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive logs completed more than N days ago (default LOG_RETENTION_DAYS).')
+        parser.add_argument('--summarized', action='store_true', default=None, help='Also archive every summarized experiment.')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true', help='Only count the archivable experiments.')
+        parser.add_argument('--vacuum', action='store_true', help='Reclaim the freed space afterwards (SQLite).')
+
+    def handle(self, *args, **options):
+        experiments = Experiment.get_archivable(days=options['days'], summarized=options['summarized'])
+        if options['dry_run']:
+            self.stdout.write(f'{experiments.count()} experiment log(s) to archive')
+            return
+
+        start = time.perf_counter()
+        archived = Experiment.archive_logs(experiments, batch_size=options['batch_size'])
+        self.stdout.write(f'Archived {archived} log(s) in {time.perf_counter() - start:.1f}s')
+
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write('Vacuumed the database')
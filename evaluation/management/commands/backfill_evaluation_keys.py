@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from common import function
+from evaluation.models import Evaluation
+
+
+class Command(BaseCommand):
+    help = 'Computes command and configuration digests of evaluations registered before they existed (after upgrade_schema).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        used = dict(Evaluation.objects.filter(command_key__isnull=False).values_list('command_key', 'signature'))
+        pending = Evaluation.objects.filter(Q(command_key__isnull=True) | Q(configuration_key='')).order_by('pk').only(
+            'pk', 'signature', 'command', 'configuration', 'command_key',
+        )
+
+        batch, updated, collisions = [], 0, []
+        for evaluation in pending.iterator(chunk_size=batch_size):
+            evaluation.configuration_key = function.get_configuration_key(evaluation.configuration)
+            if evaluation.command_key is None:
+                command_key = function.get_command_key(evaluation.command)
+                if command_key in used:
+                    # 同一命令的重复记录保留空摘要，留待人工合并
+                    collisions.append((used[command_key], evaluation.signature))
+                else:
+                    evaluation.command_key = command_key
+                    used[command_key] = evaluation.signature
+            batch.append(evaluation)
+            if len(batch) >= batch_size:
+                updated += Evaluation.objects.bulk_update(batch, ['command_key', 'configuration_key'])
+                batch = []
+        if batch:
+            updated += Evaluation.objects.bulk_update(batch, ['command_key', 'configuration_key'])
+
+        self.stdout.write(f'Updated {updated} evaluation(s)')
+        for kept, duplicate in collisions:
+            self.stdout.write(f'Duplicate command: {duplicate} repeats {kept}, left without a command key')
@@ -0,0 +1,118 @@
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from common import handler
+from config.models import Config
+from evaluation.benchmark import SCALES, SyntheticData, Benchmark, compare
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks hot endpoints and write paths on a synthetic test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small')
+        parser.add_argument('--evaluations', type=int, default=None, help='Overrides the scale preset.')
+        parser.add_argument('--seeds', type=int, default=5)
+        parser.add_argument('--log-epochs', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--cases', default=None, help='Comma separated subset of cases.')
+        parser.add_argument('--database', default=None, help='On-disk SQLite file for the test database.')
+        parser.add_argument('--output', default=None, help='Result JSON path, defaults to benchmarks/<commit>-<scale>.json.')
+        parser.add_argument('--compare', default=None, help='Previous result JSON to compare against.')
+        parser.add_argument('--threshold', type=float, default=0.2)
+        parser.add_argument('--wire', action='store_true', help='Also measure payload sizes per wire format and coding.')
+
+    @staticmethod
+    def get_commit():
+        try:
+            return subprocess.check_output(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, stderr=subprocess.DEVNULL,
+            ).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return 'unknown'
+
+    def handle(self, *args, **options):
+        evaluations = options['evaluations'] or SCALES[options['scale']]
+        if options['database']:
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = options['database']
+
+        # 使用独立测试库和进程内缓存，不影响线上数据，也不让线上 worker 读到测试 token；
+        # 分析快照来自线上库，测试期间不使用
+        with override_settings(CACHES=BENCHMARK_CACHES, ANALYTICS_DATABASE=None):
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                token = 'benchmark'
+                Config.set('auth', token)
+
+                start = time.perf_counter()
+                SyntheticData(evaluations=evaluations, seeds=options['seeds'], log_epochs=options['log_epochs']).generate()
+                self.stdout.write(f'Generated {evaluations} evaluations in {time.perf_counter() - start:.1f}s')
+
+                cases = options['cases'] and options['cases'].split(',')
+                benchmark = Benchmark(repeat=options['repeat'], token=token)
+                results = benchmark.run(cases)
+                wire = benchmark.run_wire() if options['wire'] else None
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        commit = self.get_commit()
+        output = dict(
+            meta=dict(
+                commit=commit,
+                scale=options['scale'],
+                evaluations=evaluations,
+                seeds=options['seeds'],
+                repeat=options['repeat'],
+                timestamp=datetime.now().isoformat(),
+                python=platform.python_version(),
+                django=django.get_version(),
+            ),
+            results=results,
+        )
+        if wire:
+            output['wire'] = wire
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<24} median {result["median_ms"]:>10.2f}ms  p95 {result["p95_ms"]:>10.2f}ms  '
+                f'queries {result["queries"]:>6}  peak {result["peak_kb"]:>10.1f}KB'
+            )
+
+        for payload, encodings in (wire or {}).items():
+            baseline = encodings['json_pretty']
+            for name, item in encodings.items():
+                saved = 1 - item['bytes'] / baseline['bytes']
+                self.stdout.write(
+                    f'{payload:<20} {name:<16} {item["bytes"]:>10}B  {saved:>7.1%} saved  {item["encode_ms"]:>8.2f}ms'
+                )
+
+        path = options['output'] or os.path.join(settings.BASE_DIR, 'benchmarks', f'{commit}-{options["scale"]}.json')
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler.json_save(output, path)
+        self.stdout.write(f'Saved results to {path}')
+
+        if options['compare']:
+            report = compare(output, handler.json_load(options['compare']), threshold=options['threshold'])
+            for name, item in report.items():
+                flag = 'REGRESSION' if item['regression'] else ''
+                ratio = f'{item["ratio"]:.2f}x' if item['ratio'] else '-'
+                self.stdout.write(f'{name:<24} {ratio:>8}  queries {item["baseline_queries"]} -> {item["queries"]}  {flag}')
@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluation.analytics import build_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Builds the read-only analytics snapshot of the database used by export and report endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0, help='Rebuild every N seconds (0 runs once).')
+
+    def handle(self, *args, **options):
+        if not settings.ANALYTICS_DATABASE:
+            raise CommandError('ANALYTICS_DATABASE is not configured')
+
+        interval = options['interval']
+        while True:
+            result = build_snapshot()
+            self.stdout.write(f'Built analytics snapshot ({result["size"] / 2 ** 20:.1f}MB) in {result["duration"]:.2f}s')
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluation.dump import dump
+
+
+class Command(BaseCommand):
+    help = 'Dumps evaluations, tags and experiments as compressed NDJSON or Parquet partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Output directory, an interrupted dump resumes from its manifest.')
+        parser.add_argument('--format', choices=['ndjson', 'parquet'], default='ndjson')
+        parser.add_argument('--logs', action='store_true', help='Include experiment logs.')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--partition-size', type=int, default=20000, help='Rows per partition.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        def report(table, partition):
+            self.stdout.write(f'{partition["file"]}: {partition["rows"]} rows, {partition["bytes"] / 1024:.1f}KB')
+
+        try:
+            manifest = dump(
+                options['directory'],
+                export_format=options['format'],
+                logs=options['logs'],
+                workers=options['workers'],
+                partition_size=options['partition_size'],
+                callback=report,
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        rows = sum(p.get('rows', 0) for info in manifest['tables'].values() for p in info['partitions'])
+        self.stdout.write(f'Dumped {rows} rows in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from evaluation.dump import load
+
+
+class Command(BaseCommand):
+    help = 'Restores a dump_results directory into the current database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--ignore-conflicts', action='store_true', help='Skip rows whose primary key already exists.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = 0
+
+        def report(table, partition, count):
+            nonlocal rows
+            rows += count
+            self.stdout.write(f'{partition["file"]}: {count} rows')
+
+        try:
+            load(options['directory'], batch_size=options['batch_size'], ignore_conflicts=options['ignore_conflicts'], callback=report)
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(e)
+        self.stdout.write(f'Restored {rows} rows in {time.perf_counter() - start:.1f}s')
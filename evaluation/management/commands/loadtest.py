@@ -0,0 +1,120 @@
+import multiprocessing
+import statistics
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.crypto import get_random_string
+
+from config.models import Config
+
+DEFAULT_PATHS = [
+    '/evaluations/?page=1',
+    '/evaluations/export?replicate=5&top_k=3',
+    '/evaluations/report?columns=dataset',
+    '/tags/',
+]
+
+
+def fetch(url, method='GET', token=None):
+    request = urllib.request.Request(url, method=method, data=b'' if method == 'POST' else None)
+    request.add_header('Accept-Encoding', 'gzip')
+    if token:
+        request.add_header('Authentication', token)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as error:
+        status = error.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def run_client(args):
+    """Requests the paths round-robin until `duration` seconds have passed."""
+    url, paths, duration, index = args
+    results = []
+    deadline = time.perf_counter() + duration
+    i = index
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        status, seconds = fetch(url + path)
+        results.append((path, status, seconds))
+        i += 1
+    return results
+
+
+def check_auth(args):
+    url, token, requests = args
+    # 认证通过时返回 404（会话不存在），仍拿着旧 token 的 worker 返回 401
+    return [fetch(f'{url}/experiments/loadtest/heartbeat', method='POST', token=token)[0] for _ in range(requests)]
+
+
+class Command(BaseCommand):
+    help = 'Load tests a running server from several client processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server.')
+        parser.add_argument('--clients', type=int, default=8, help='Number of client processes.')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds each client keeps sending requests.')
+        parser.add_argument('--paths', default=None, help='Comma separated paths, defaults to the hot read endpoints.')
+        parser.add_argument(
+            '--check-auth', action='store_true',
+            help='Rotate the auth token and verify every worker accepts the new one, then restore it. '
+                 'Must run with the same settings (database and cache) as the server.',
+        )
+
+    def handle(self, *args, **options):
+        url = options['url'].rstrip('/')
+        paths = options['paths'].split(',') if options['paths'] else DEFAULT_PATHS
+        clients = options['clients']
+
+        with multiprocessing.Pool(clients) as pool:
+            start = time.perf_counter()
+            results = pool.map(run_client, [(url, paths, options['duration'], i) for i in range(clients)])
+            elapsed = time.perf_counter() - start
+
+            if options['check_auth']:
+                self.check_auth(pool, url, clients)
+
+        by_path = dict()
+        for path, status, seconds in (item for client in results for item in client):
+            by_path.setdefault(path, []).append((status, seconds))
+
+        total = sum(len(items) for items in by_path.values())
+        self.stdout.write(f'{total} requests from {clients} clients in {elapsed:.1f}s, {total / elapsed:.1f} req/s')
+        failed = 0
+        for path, items in by_path.items():
+            latencies = sorted(seconds for _, seconds in items)
+            errors = sum(1 for status, _ in items if not 200 <= status < 400)
+            failed += errors
+            quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+            self.stdout.write(
+                f'{path:<48} {len(items):>7} req  p50 {quantiles[49] * 1000:>8.1f}ms  '
+                f'p95 {quantiles[94] * 1000:>8.1f}ms  p99 {quantiles[98] * 1000:>8.1f}ms  errors {errors}'
+            )
+        if failed:
+            raise CommandError(f'{failed} request(s) failed')
+
+    def check_auth(self, pool, url, clients):
+        previous = Config.get_cached('auth')
+        # 先用旧 token 请求一轮，让每个 worker 都缓存住旧值
+        pool.map(check_auth, [(url, previous, 20)] * clients)
+        token = get_random_string(32)
+        Config.set('auth', token)
+        try:
+            statuses = [status for client in pool.map(check_auth, [(url, token, 20)] * clients) for status in client]
+        finally:
+            if previous is None:
+                Config.remove('auth')
+            else:
+                Config.set('auth', previous)
+
+        rejected = statuses.count(401)
+        self.stdout.write(f'Auth rotation: {len(statuses) - rejected}/{len(statuses)} requests accepted the new token')
+        if rejected:
+            raise CommandError(f'{rejected} request(s) were served by workers with a stale auth token')
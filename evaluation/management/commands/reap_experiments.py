@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from evaluation.models import Experiment
+
+
+class Command(BaseCommand):
+    help = 'Marks running experiments without a recent heartbeat as failed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0, help='Repeat every N seconds (0 runs once).')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            reaped = Experiment.reap()
+            if reaped:
+                self.stdout.write(f'Marked {reaped} stale experiment(s) as failed')
+            if not interval:
+                break
+            time.sleep(interval)
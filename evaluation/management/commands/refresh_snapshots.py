@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from evaluation.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Recomputes leaderboard snapshots whose results have changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0, help='Repeat every N seconds (0 runs once).')
+        parser.add_argument('--force', action='store_true', help='Recompute even if the results are unchanged.')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            for snapshot in refresh_snapshots(force=options['force']):
+                params = snapshot.get_params()
+                self.stdout.write(
+                    f'Refreshed snapshot replicate={params["replicate"]} metrics={params["metrics"]} '
+                    f'datasets={params["datasets"]} top_k={params["top_k"]} in {snapshot.duration:.2f}s'
+                )
+            if not interval:
+                break
+            time.sleep(interval)
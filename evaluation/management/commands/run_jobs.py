@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from evaluation.jobs import queue, run_pending
+from evaluation.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (log summaries, snapshot refreshes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=0, help='Keep running with N worker threads (0 drains the queue once).')
+        parser.add_argument('--retry-failed', action='store_true', help='Requeue jobs that exhausted their attempts first.')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f'Requeued {Job.retry_failed()} failed job(s)')
+
+        if not options['threads']:
+            Job.requeue_stale()
+            self.stdout.write(f'Ran {run_pending()} job(s), queue: {Job.get_counts()}')
+            return
+
+        queue.start(options['threads'])
+        try:
+            for thread in queue.threads:
+                thread.join()
+        except KeyboardInterrupt:
+            queue.stop()
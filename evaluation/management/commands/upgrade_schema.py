@@ -0,0 +1,93 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from evaluation.models import Evaluation
+
+APPS = ('config', 'evaluation')
+
+
+class Command(BaseCommand):
+    help = (
+        'Brings tables created by an older version with `migrate --run-syncdb` up to date: creates missing '
+        'tables, adds missing columns and indexes, and drops the old unique constraint on the evaluation '
+        'command. Run backfill_evaluation_keys afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    @staticmethod
+    def get_columns(connection, table):
+        with connection.cursor() as cursor:
+            return {column.name for column in connection.introspection.get_table_description(cursor, table)}
+
+    @staticmethod
+    def add_column(editor, model, field):
+        """
+        Adds the column of a field with ALTER TABLE ... ADD COLUMN, existing rows take the field default.
+
+        The SQLite backend's add_field rebuilds the table from the current model and copies every
+        column the old table lacks as a string literal of its name, so it cannot be used here.
+        """
+        if not field.null and editor.effective_default(field) is None:
+            raise CommandError(f'Cannot add {model._meta.db_table}.{field.column}: it is NOT NULL without a default')
+        # SQLite 不允许以 UNIQUE 加列，唯一约束改为随后建唯一索引
+        column = field.clone()
+        column._unique = False
+        column.set_attributes_from_name(field.name)
+        column.model = model
+        definition, params = editor.column_sql(model, column, include_default=True)
+        editor.execute(
+            f'ALTER TABLE {editor.quote_name(model._meta.db_table)} ADD COLUMN {editor.quote_name(field.column)} {definition}',
+            params,
+        )
+        if field.unique:
+            editor.execute(editor._create_unique_sql(model, [field]))
+        elif field.db_index:
+            editor.execute(editor._create_index_sql(model, fields=[field]))
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        introspection = connection.introspection
+        models = [model for model in apps.get_models() if model._meta.app_label in APPS and model._meta.managed]
+
+        changes = []
+        with connection.schema_editor() as editor:
+            with connection.cursor() as cursor:
+                tables = set(introspection.table_names(cursor))
+
+            for model in models:
+                table = model._meta.db_table
+                if table not in tables:
+                    editor.create_model(model)
+                    changes.append(f'created table {table}')
+                    continue
+
+                columns = self.get_columns(connection, table)
+                with connection.cursor() as cursor:
+                    constraints = introspection.get_constraints(cursor, table)
+                for field in model._meta.local_concrete_fields:
+                    if field.column not in columns:
+                        self.add_column(editor, model, field)
+                        changes.append(f'added column {table}.{field.column}')
+                    elif field.db_index and not field.unique:
+                        if not any(c['columns'] == [field.column] and (c['index'] or c['unique']) for c in constraints.values()):
+                            editor.execute(editor._create_index_sql(model, fields=[field]))
+                            changes.append(f'added index on {table}.{field.column}')
+
+            # command 曾经是唯一字段，现在由 command_key 去重
+            field = Evaluation._meta.get_field('command')
+            with connection.cursor() as cursor:
+                constraints = introspection.get_constraints(cursor, Evaluation._meta.db_table)
+            if any(c['unique'] and c['columns'] == [field.column] for c in constraints.values()):
+                old_field = field.clone()
+                old_field._unique = True
+                old_field.set_attributes_from_name(field.name)
+                old_field.model = Evaluation
+                editor.alter_field(Evaluation, old_field, field)
+                changes.append(f'dropped unique constraint on {Evaluation._meta.db_table}.{field.column}')
+
+        for change in changes:
+            self.stdout.write(change)
+        self.stdout.write(f'{len(changes)} schema change(s)' if changes else 'Schema is up to date')
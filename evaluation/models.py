@@ -1,13 +1,24 @@
+import os
 import re
+import threading
+import time
 from datetime import timedelta, datetime
 
 import numpy as np
 from diq import Dictify
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, models, router, transaction
+from django.db.models import Count, Max, Q, Sum, Value
+from django.db.models.functions import Least
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 
 from common import handler, function
+from common.conditional import make_etag
 from common.space import Space
+from config.models import Config
+from evaluation import archive
 from evaluation.validators import EvaluationValidator, EvaluationErrors, TagValidator, ExperimentValidator
 
 
@@ -15,8 +26,11 @@ class Evaluation(models.Model, Dictify):
     vldt = EvaluationValidator
 
     signature = models.CharField(max_length=vldt.MAX_SIGNATURE_LENGTH, unique=True)
-    command = models.TextField(unique=True)
+    command = models.TextField()
     configuration = models.TextField()
+    # 命令与配置的规范化摘要，唯一性和查找都走这两个短索引
+    command_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    configuration_key = models.CharField(max_length=64, db_index=True, blank=True, default='')
 
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
@@ -26,23 +40,46 @@ class Evaluation(models.Model, Dictify):
     def create(cls, signature, command, configuration):
         """Creates or updates an evaluation entry."""
         try:
-            return cls.objects.create(
+            evaluation = cls.objects.create(
                 signature=signature,
                 command=command,
                 configuration=configuration,
+                command_key=function.get_command_key(command),
+                configuration_key=function.get_configuration_key(configuration),
             )
         except Exception as e:
             raise EvaluationErrors.EVALUATION_CREATION(details=e)
+        Experiment.bump_results_version()
+        return evaluation
+
+    @classmethod
+    def get_by_command(cls, command):
+        """Retrieves the evaluation of a command by its digest, whatever the argument order."""
+        command_key = function.get_command_key(command)
+        try:
+            return cls.objects.get(command_key=command_key)
+        except cls.DoesNotExist:
+            pass
+        # 尚未回填摘要的旧记录，见 backfill_evaluation_keys
+        evaluation = cls.objects.filter(command_key__isnull=True, command=command).first()
+        if evaluation is None:
+            raise cls.DoesNotExist
+        evaluation.command_key = command_key
+        evaluation.configuration_key = function.get_configuration_key(evaluation.configuration)
+        evaluation.save(update_fields=['command_key', 'configuration_key'])
+        return evaluation
 
     @classmethod
     def create_or_get(cls, signature, command, configuration):
         """Creates or retrieves an evaluation entry."""
         try:
-            evaluation = cls.objects.get(command=command)
+            evaluation = cls.get_by_command(command)
             if evaluation.signature != signature:
                 evaluation.signature = signature
                 evaluation.configuration = configuration
-                evaluation.save()
+                evaluation.configuration_key = function.get_configuration_key(configuration)
+                evaluation.save(update_fields=['signature', 'configuration', 'configuration_key', 'modified_at'])
+                Experiment.bump_results_version()
             return evaluation
         except cls.DoesNotExist:
             return cls.create(
@@ -51,6 +88,11 @@ class Evaluation(models.Model, Dictify):
                 configuration=configuration,
             )
 
+    def delete(self, *args, **kwargs):
+        deleted = super().delete(*args, **kwargs)
+        Experiment.bump_results_version()
+        return deleted
+
     @classmethod
     def exist_by_signature(cls, signature):
         """Check if an evaluation entry exists by signature."""
@@ -64,6 +106,21 @@ class Evaluation(models.Model, Dictify):
         except cls.DoesNotExist:
             raise EvaluationErrors.EVALUATION_NOT_FOUND
 
+    @classmethod
+    def get_version(cls, signature):
+        """ETag and last-modified time of an evaluation with its experiments, from one aggregate query."""
+        version = cls.objects.filter(signature=signature).annotate(
+            experiments=Count('experiment'),
+            completed=Count('experiment', filter=Q(experiment__is_completed=True)),
+            failed=Count('experiment', filter=Q(experiment__is_failed=True)),
+            last_completed=Max('experiment__completed_at'),
+            last_seen=Max('experiment__last_seen'),
+        ).values_list('pk', 'modified_at', 'experiments', 'completed', 'failed', 'last_completed', 'last_seen').first()
+        if version is None:
+            return None
+        last_modified = max(t for t in (version[1], version[5], version[6]) if t)
+        return make_etag('evaluation', *version), last_modified
+
     def get_tags(self):
         """Returns the tags associated with this evaluation."""
         return self.tags.all()
@@ -74,8 +131,14 @@ class Evaluation(models.Model, Dictify):
     def _dictify_modified_at(self):
         return self.modified_at.astimezone(Space.tz).isoformat()
 
+    def get_experiments(self):
+        """Experiments of this evaluation without their logs, reusing prefetched rows when available."""
+        if 'experiment_set' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.experiment_set.all()
+        return self.experiment_set.defer('log')
+
     def _dictify_experiments(self):
-        return [exp.jsonl() for exp in self.experiment_set.all()]
+        return Experiment.jsonl_many(self.get_experiments())
 
     def prettify_configuration(self):
         if self.configuration:
@@ -86,10 +149,12 @@ class Evaluation(models.Model, Dictify):
         return self.prettify_configuration()
 
     def prettify_performance(self, metrics=None):
-        experiments = self.experiment_set.filter(is_completed=True)
+        experiments = self.experiment_set.filter(is_completed=True).values_list('performance', flat=True)
         performance = dict()
-        for experiment in experiments:
-            current_performance = experiment.dictify_performance()
+        for current_performance in experiments:
+            current_performance = current_performance and handler.json_loads(current_performance)
+            if not current_performance:
+                continue
             for metric in current_performance:
                 if metrics and metric.lower() not in metrics:
                     continue
@@ -121,18 +186,22 @@ class Evaluation(models.Model, Dictify):
             return 0
         return sum(values) / len(values)
 
-    def _dictify_params(self):
-        kwargs = function.argparse(self.command)
+    @staticmethod
+    def parse_params(command):
+        kwargs = function.argparse(command)
         data_name = kwargs['data'].split('/')[-1].split('.')[0]
         model_name = kwargs['model'].split('/')[-1].split('.')[0]
         return dict(
             data=data_name,
             model=model_name,
-            batch_size=kwargs['batch_size'],
-            lr=kwargs['lr'],
-            lm=kwargs['lm'],
+            batch_size=kwargs.get('batch_size'),
+            lr=kwargs.get('lr'),
+            lm=kwargs.get('lm'),
         )
 
+    def _dictify_params(self):
+        return self.parse_params(self.command)
+
     def jsonl(self):
         return self.dictify('signature', 'command', 'created_at', 'modified_at', 'comment', 'experiments')
 
@@ -163,6 +232,12 @@ class Tag(models.Model, Dictify):
         except cls.DoesNotExist:
             raise EvaluationErrors.TAG_NOT_FOUND
 
+    @classmethod
+    def get_membership_version(cls, name):
+        """Changes whenever evaluations are added to or removed from the tag (ids are never reused)."""
+        membership = cls.evaluations.through.objects.filter(tag__name=name).aggregate(count=Count('pk'), last=Max('pk'))
+        return membership['count'], membership['last']
+
     @classmethod
     def remove(cls, name):
         tag = cls.get_by_name(name)
@@ -172,15 +247,81 @@ class Tag(models.Model, Dictify):
         """Associates an evaluation with the tag."""
         self.evaluations.add(evaluation)
 
+    @staticmethod
+    def _get_evaluation_ids(signatures):
+        signatures = set(signatures)
+        evaluations = dict(Evaluation.objects.filter(signature__in=signatures).values_list('signature', 'pk'))
+        missing = signatures - set(evaluations)
+        if missing:
+            raise EvaluationErrors.EVALUATION_NOT_FOUND(details=', '.join(sorted(missing)))
+        return list(evaluations.values())
+
+    def add_evaluations(self, signatures):
+        """Tags many evaluations at once, one lookup and one bulk insert regardless of their number."""
+        self.evaluations.add(*self._get_evaluation_ids(signatures))
+
+    def remove_evaluations(self, signatures):
+        self.evaluations.remove(*self._get_evaluation_ids(signatures))
+
+    def get_experiments(self):
+        return Experiment.objects.filter(evaluation__tags=self)
+
+    def get_progress(self, replicate=5):
+        """Completion of the sweep: evaluations with `replicate` completed seeds and experiment states."""
+        evaluations = Evaluation.objects.filter(tags=self).annotate(
+            completed=Count('experiment', filter=Q(experiment__is_completed=True)),
+        ).aggregate(
+            total=Count('pk'),
+            finished=Count('pk', filter=Q(completed__gte=replicate)),
+            completed_seeds=Sum(Least('completed', Value(replicate))),
+        )
+        experiments = self.get_experiments().aggregate(
+            total=Count('pk'),
+            completed=Count('pk', filter=Q(is_completed=True)),
+            failed=Count('pk', filter=Q(is_completed=False, is_failed=True)),
+            running=Count('pk', filter=Q(is_completed=False, is_failed=False, last_seen__gte=Experiment.stale_before())),
+        )
+        experiments['pending'] = experiments['total'] - experiments['completed'] - experiments['failed'] - experiments['running']
+
+        expected = evaluations['total'] * replicate
+        return dict(
+            name=self.name,
+            replicate=replicate,
+            evaluations=dict(total=evaluations['total'], finished=evaluations['finished']),
+            experiments=experiments,
+            progress=(evaluations['completed_seeds'] or 0) / expected if expected else None,
+        )
+
+    def get_running_time(self):
+        """Total GPU time of the sweep in hours, from the summarized experiment durations."""
+        running = self.get_experiments().filter(data_final_time__isnull=False).aggregate(
+            experiments=Count('pk'),
+            total=Sum('data_final_time'),
+            prep=Sum('data_prep_time'),
+        )
+        total, prep = running['total'] or 0, running['prep'] or 0
+        return dict(
+            name=self.name,
+            experiments=running['experiments'],
+            total_hours=total / 3600,
+            prep_hours=prep / 3600,
+            training_hours=(total - prep) / 3600,
+        )
+
     def _dictify_evaluations(self):
-        return [evaluation.signature for evaluation in self.evaluations.all()]
+        return list(self.evaluations.order_by('pk').values_list('signature', flat=True))
+
+    def _dictify_count(self):
+        if hasattr(self, 'evaluation_count'):
+            return self.evaluation_count
+        return self.evaluations.count()
 
     def json(self):
         """Serializes the tag model to a dictionary."""
         return self.dictify('name', 'evaluations')
 
     def jsonl(self):
-        return self.dictify('name')
+        return self.dictify('name', 'count')
 
 
 
@@ -191,12 +332,18 @@ class Experiment(models.Model, Dictify):
     seed = models.IntegerField()
     session = models.CharField(max_length=vldt.MAX_SESSION_LENGTH, unique=True)
     log = models.TextField(null=True, blank=True)
+    # 冷存储位置：归档后 log 置空，内容在 LOG_ARCHIVE_DIR 下的打包文件中
+    log_archive = models.CharField(max_length=100, blank=True, default='')
+    log_offset = models.BigIntegerField(null=True, blank=True)
+    log_length = models.IntegerField(null=True, blank=True)
     performance = models.TextField(null=True, blank=True)
     pid = models.IntegerField(null=True, blank=True)
     is_completed = models.BooleanField(default=False)
+    is_failed = models.BooleanField(default=False)
+    last_seen = models.DateTimeField(null=True, blank=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
-    completed_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(auto_now=True, db_index=True)
 
     data_start_time = models.IntegerField(null=True, blank=True)
     data_final_time = models.IntegerField(null=True, blank=True)
@@ -212,6 +359,7 @@ class Experiment(models.Model, Dictify):
             seed=seed,
             session=get_random_string(length=32),
         )
+        cls.bump_results_version()
         return exp
 
     @classmethod
@@ -238,20 +386,138 @@ class Experiment(models.Model, Dictify):
             return cls.create_or_get(evaluation, seed)
         raise EvaluationErrors.EMPTY_QUERY
 
+    @classmethod
+    def get_version(cls, session=None, signature=None, seed=None):
+        """ETag and last-modified time of a single experiment, without loading its log."""
+        if session:
+            experiments = cls.objects.filter(session=session)
+        elif signature and seed is not None:
+            experiments = cls.objects.filter(evaluation__signature=signature, seed=seed)
+        else:
+            return None
+        version = experiments.values_list(
+            'session', 'completed_at', 'last_seen', 'is_completed', 'is_failed', 'pid',
+            'data_final_time', 'data_total_epochs', 'evaluation__signature',
+        ).first()
+        if version is None:
+            return None
+        last_modified = max(t for t in (version[1], version[2]) if t)
+        return make_etag('experiment', *version), last_modified
+
+    RESULTS_VERSION_KEY = 'results_version'
+
+    @staticmethod
+    def new_results_version():
+        return f'{time.time():.6f}:{get_random_string(8)}'
+
+    @classmethod
+    def bump_results_version(cls):
+        """Renews the global results version once the current transaction commits."""
+        transaction.on_commit(lambda: Config.set(cls.RESULTS_VERSION_KEY, cls.new_results_version()))
+
+    @classmethod
+    def get_results_version(cls):
+        """
+        Global version of all results, changes whenever an evaluation or experiment does.
+
+        Live reads use the token bump_results_version renews on every such write, reads from the
+        analytics snapshot use the snapshot file, which is replaced on every rebuild. Neither
+        looks at the result tables, so a 304 costs a single lookup.
+        """
+        alias = router.db_for_read(cls)
+        if alias != DEFAULT_DB_ALIAS:
+            stat = os.stat(connections.databases[alias]['NAME'])
+            last_modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_default_timezone())
+            return make_etag('results', alias, stat.st_ino, stat.st_mtime_ns), last_modified
+
+        # 直接读库而不走缓存：任务进程和管理命令的写入也必须立即生效
+        version = Config.objects.filter(key=cls.RESULTS_VERSION_KEY).values_list('value', flat=True).first()
+        if version is None:
+            # 新库或从旧版本升级的库，首次读取时生成
+            version = cls.new_results_version()
+            Config.set(cls.RESULTS_VERSION_KEY, version)
+        last_modified = datetime.fromtimestamp(float(version.split(':')[0]), tz=timezone.get_default_timezone())
+        return make_etag('results', version), last_modified
+
     def register(self, pid):
         self.pid = pid
-        self.save()
+        self.last_seen = timezone.now()
+        self.is_failed = False
+        self.save(update_fields=['pid', 'last_seen', 'is_failed'])
+        self.invalidate_cache()
+
+    @classmethod
+    def heartbeat(cls, session):
+        """Refreshes the liveness of a running experiment with a single-column UPDATE."""
+        updated = cls.objects.filter(session=session, is_completed=False).update(
+            last_seen=timezone.now(),
+            is_failed=False,
+        )
+        if not updated:
+            if cls.objects.filter(session=session).exists():
+                raise EvaluationErrors.ALREADY_COMPLETED
+            raise EvaluationErrors.EXP_NOT_FOUND
+
+    @staticmethod
+    def stale_before():
+        return timezone.now() - timedelta(seconds=settings.EXPERIMENT_STALE_TIMEOUT)
+
+    @classmethod
+    def reap(cls):
+        """Marks running experiments without a recent heartbeat as failed, returns the number reaped."""
+        return cls.objects.filter(
+            is_completed=False,
+            is_failed=False,
+            last_seen__lt=cls.stale_before(),
+        ).update(is_failed=True)
+
+    @classmethod
+    def get_seed_status(cls, evaluation, seeds=None):
+        """Splits seeds of an evaluation into completed, running and pending (never started, crashed or stale)."""
+        completed, running = set(), set()
+        stale_before = cls.stale_before()
+        for seed, is_completed, is_failed, last_seen in cls.objects.filter(evaluation=evaluation).values_list(
+            'seed', 'is_completed', 'is_failed', 'last_seen',
+        ):
+            if is_completed:
+                completed.add(seed)
+            elif not is_failed and last_seen and last_seen >= stale_before:
+                running.add(seed)
+
+        if seeds is None:
+            seeds = cls.objects.filter(evaluation=evaluation).values_list('seed', flat=True)
+        pending = [seed for seed in seeds if seed not in completed and seed not in running]
+        return dict(
+            completed=sorted(completed),
+            running=sorted(running),
+            pending=sorted(set(pending)),
+        )
 
     def complete(self, log, performance):
         """Marks the experiment as completed."""
         if self.is_completed:
             raise EvaluationErrors.ALREADY_COMPLETED
-        self.log = log
-        self.performance = performance
-        self.is_completed = True
-        self.save()
 
-        self.summarize()
+        # 条件更新保证并发 PUT 只有一个能完成该实验
+        fields = dict(
+            log=log,
+            performance=performance,
+            is_completed=True,
+            is_failed=False,
+            completed_at=timezone.now(),
+        )
+        with transaction.atomic():
+            updated = Experiment.objects.filter(pk=self.pk, is_completed=False).update(**fields)
+            if updated:
+                # 日志解析等耗时工作交给任务队列，完成请求的耗时与日志大小无关
+                Job.enqueue(Job.SUMMARIZE, self.session)
+                Experiment.bump_results_version()
+                if settings.SNAPSHOT_REFRESH_DELAY is not None:
+                    Job.enqueue(Job.REFRESH_SNAPSHOTS, delay=settings.SNAPSHOT_REFRESH_DELAY, unique=True)
+        if not updated:
+            raise EvaluationErrors.ALREADY_COMPLETED
+        for key, value in fields.items():
+            setattr(self, key, value)
 
     def _dictify_created_at(self):
         return self.created_at.astimezone(Space.tz).isoformat()
@@ -259,6 +525,9 @@ class Experiment(models.Model, Dictify):
     def _dictify_completed_at(self):
         return self.completed_at.astimezone(Space.tz).isoformat()
 
+    def _dictify_last_seen(self):
+        return self.last_seen and self.last_seen.astimezone(Space.tz).isoformat()
+
     def _dictify_signature(self):
         return self.evaluation.signature
 
@@ -280,16 +549,101 @@ class Experiment(models.Model, Dictify):
             valid_metrics=self.data_valid_metrics and handler.json_loads(self.data_valid_metrics),
         )
 
+    def get_log(self):
+        """The log from the database, or from its cold-tier archive once archived."""
+        if self.log is None and self.log_archive:
+            return archive.read(self.log_archive, self.log_offset, self.log_length)
+        return self.log
+
     def prettify_log(self):
-        if self.log:
-            return self.log.split('\n')
+        log = self.get_log()
+        if log:
+            return log.split('\n')
         return None
 
+    def get_archive_name(self):
+        if settings.LOG_ARCHIVE_PACKING == 'evaluation':
+            return f'evaluations/{self.evaluation_id}'
+        return self.completed_at.strftime('%Y-%m')
+
+    @classmethod
+    def get_archivable(cls, days=None, summarized=None):
+        """Completed experiments whose log should move to the cold tier under the retention policy."""
+        days = settings.LOG_RETENTION_DAYS if days is None else days
+        summarized = settings.LOG_ARCHIVE_SUMMARIZED if summarized is None else summarized
+        policy = Q(completed_at__lt=timezone.now() - timedelta(days=days))
+        if summarized:
+            policy |= Q(data_final_time__isnull=False)
+        return cls.objects.filter(policy, is_completed=True, log__isnull=False)
+
+    @classmethod
+    def archive_logs(cls, experiments, batch_size=200):
+        """
+        Moves the logs of `experiments` into archive files, returns the number archived.
+
+        Each batch is appended and fsynced before its rows are updated, so a crash leaves at most
+        unreferenced bytes in an archive, never a row pointing at missing data.
+        """
+        pks = list(experiments.values_list('pk', flat=True))
+        writer = archive.ArchiveWriter()
+        archived = 0
+        try:
+            for start in range(0, len(pks), batch_size):
+                batch = list(cls.objects.filter(pk__in=pks[start:start + batch_size], log__isnull=False).only(
+                    'pk', 'session', 'evaluation_id', 'completed_at', 'log',
+                ))
+                for experiment in batch:
+                    experiment.log_archive = experiment.get_archive_name()
+                    experiment.log_offset, experiment.log_length = writer.append(
+                        experiment.log_archive, experiment.session, experiment.log,
+                    )
+                    experiment.log = None
+                writer.sync()
+                with transaction.atomic():
+                    cls.objects.bulk_update(batch, ['log', 'log_archive', 'log_offset', 'log_length'])
+                archived += len(batch)
+        finally:
+            writer.close()
+        return archived
+
     def json(self):
-        return self.dictify('signature', 'seed', 'performance', 'is_completed', 'created_at', 'completed_at', 'pid', 'summary')
+        return self.dictify('signature', 'seed', 'performance', 'is_completed', 'is_failed', 'created_at', 'completed_at', 'last_seen', 'pid', 'summary')
+
+    def _jsonl(self):
+        return self.dictify('is_completed', 'is_failed', 'created_at', 'completed_at', 'last_seen', 'seed', 'performance', 'pid')
+
+    def get_cache_key(self):
+        # 完成后的实验不再变化，以 session 和完成时间为键
+        return f'experiment:{self.session}:{self.completed_at.timestamp():.6f}:jsonl'
+
+    def invalidate_cache(self):
+        if self.is_completed:
+            cache.delete(self.get_cache_key())
 
     def jsonl(self):
-        return self.dictify('is_completed', 'created_at', 'completed_at', 'seed', 'performance', 'pid')
+        return self.jsonl_many([self])[0]
+
+    @classmethod
+    def jsonl_many(cls, experiments):
+        """Serializes experiments, serving completed ones from the serialization cache."""
+        experiments = list(experiments)
+        keys = {experiment.pk: experiment.get_cache_key() for experiment in experiments if experiment.is_completed}
+        fragments = cache.get_many(list(keys.values())) if keys else dict()
+
+        missing = dict()
+        results = []
+        for experiment in experiments:
+            key = keys.get(experiment.pk)
+            if key is None:
+                results.append(experiment._jsonl())
+                continue
+            if key not in fragments:
+                missing[key] = fragments[key] = experiment._jsonl()
+            results.append(fragments[key])
+
+        if missing:
+            cache.set_many(missing, timeout=settings.SERIALIZATION_CACHE_TIMEOUT)
+        return results
 
     def summarize(self):
         if not self.is_completed:
@@ -358,4 +712,199 @@ class Experiment(models.Model, Dictify):
         self.data_total_epochs = len(epoch_times) - 1
         self.data_epoch_durations = handler.json_dumps(epoch_durations)
         self.data_valid_metrics = handler.json_dumps(valid_metrics)
-        self.save()
+        self.save(update_fields=[
+            'data_start_time',
+            'data_final_time',
+            'data_prep_time',
+            'data_total_epochs',
+            'data_epoch_durations',
+            'data_valid_metrics',
+        ])
+        self.bump_results_version()
+
+
+class Snapshot(models.Model, Dictify):
+    """Precomputed top-rank leaderboard for one (replicate, metrics, datasets, top_k) combination."""
+
+    replicate = models.IntegerField()
+    metrics = models.CharField(max_length=200, blank=True)
+    datasets = models.CharField(max_length=500, blank=True)
+    top_k = models.IntegerField()
+    results = models.TextField()
+    version = models.CharField(max_length=64)
+    duration = models.FloatField(default=0)
+
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('replicate', 'metrics', 'datasets', 'top_k')
+
+    @staticmethod
+    def get_key(replicate, metrics=None, datasets=None, top_k=1):
+        # 指标顺序决定表格列顺序，需保留；数据集顺序无关
+        return dict(
+            replicate=replicate,
+            metrics=','.join(metric.lower() for metric in metrics or []),
+            datasets=','.join(sorted(dataset.lower() for dataset in datasets or [])),
+            top_k=top_k,
+        )
+
+    @classmethod
+    def get_latest(cls, replicate, metrics=None, datasets=None, top_k=1):
+        """Snapshot covering the request, possibly computed with a larger top_k, or None."""
+        key = cls.get_key(replicate, metrics, datasets, top_k)
+        top_k = key.pop('top_k')
+        return cls.objects.filter(**key, top_k__gte=top_k).order_by('top_k').first()
+
+    @classmethod
+    def store(cls, results, version, duration, replicate, metrics=None, datasets=None, top_k=1):
+        snapshot, _ = cls.objects.update_or_create(
+            **cls.get_key(replicate, metrics, datasets, top_k),
+            defaults=dict(results=handler.json_dumps(results), version=version, duration=duration),
+        )
+        return snapshot
+
+    def get_params(self):
+        return dict(
+            replicate=self.replicate,
+            metrics=self.metrics.split(',') if self.metrics else None,
+            datasets=self.datasets.split(',') if self.datasets else None,
+            top_k=self.top_k,
+        )
+
+    def get_results(self, top_k=None):
+        results = handler.json_loads(self.results)
+        if top_k is not None:
+            results = {dataset: entries[:top_k] for dataset, entries in results.items()}
+        return results
+
+    def get_age(self):
+        return (timezone.now() - self.created_at).total_seconds()
+
+    def _dictify_created_at(self):
+        return self.created_at.astimezone(Space.tz).isoformat()
+
+    def _dictify_params(self):
+        return self.get_params()
+
+    def _dictify_age(self):
+        return self.get_age()
+
+    def jsonl(self):
+        return self.dictify('params', 'version', 'duration', 'created_at', 'age')
+
+
+class Job(models.Model, Dictify):
+    """
+    Background work queued in the database, executed by evaluation.jobs workers.
+
+    Failed jobs are retried with exponential backoff up to JOB_MAX_ATTEMPTS times.
+    """
+    SUMMARIZE = 'summarize'
+    REFRESH_SNAPSHOTS = 'refresh_snapshots'
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [(status, status) for status in (PENDING, RUNNING, DONE, FAILED)]
+
+    # 多进程共用数据库时靠轮询发现新任务，同进程内由该事件立即唤醒
+    wakeup = threading.Event()
+
+    kind = models.CharField(max_length=50)
+    target = models.CharField(max_length=100, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+    run_after = models.DateTimeField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    @classmethod
+    def enqueue(cls, kind, target='', delay=0, unique=False):
+        """Queues a job, or returns the pending one of the same kind and target when `unique`."""
+        if unique:
+            job = cls.objects.filter(kind=kind, target=target, status=cls.PENDING).first()
+            if job is not None:
+                return job
+        job = cls.objects.create(kind=kind, target=target, run_after=timezone.now() + timedelta(seconds=delay))
+        transaction.on_commit(cls.wakeup.set)
+        return job
+
+    @classmethod
+    def enqueue_many(cls, kind, targets, batch_size=1000):
+        """Queues one job per target, skipping targets with a pending or running job of the kind. Returns the number queued."""
+        active = cls.objects.filter(kind=kind, status__in=[cls.PENDING, cls.RUNNING]).values_list('target', flat=True)
+        targets = sorted(set(targets) - set(active))
+        now = timezone.now()
+        cls.objects.bulk_create([cls(kind=kind, target=target, run_after=now) for target in targets], batch_size=batch_size)
+        if targets:
+            transaction.on_commit(cls.wakeup.set)
+        return len(targets)
+
+    @classmethod
+    def claim(cls):
+        """Atomically takes the next due job, None when there is none."""
+        while True:
+            job = cls.objects.filter(status=cls.PENDING, run_after__lte=timezone.now()).order_by('run_after', 'pk').first()
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = cls.objects.filter(pk=job.pk, status=cls.PENDING).update(
+                status=cls.RUNNING,
+                started_at=now,
+                attempts=job.attempts + 1,
+            )
+            if claimed:
+                job.status, job.started_at, job.attempts = cls.RUNNING, now, job.attempts + 1
+                return job
+
+    def succeed(self):
+        self.status = self.DONE
+        self.finished_at = timezone.now()
+        self.error = ''
+        self.save(update_fields=['status', 'finished_at', 'error'])
+
+    def fail(self, error):
+        """Schedules a retry with exponential backoff, or marks the job failed after the last attempt."""
+        self.error = error
+        self.finished_at = timezone.now()
+        if self.attempts < settings.JOB_MAX_ATTEMPTS:
+            self.status = self.PENDING
+            self.run_after = self.finished_at + timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (self.attempts - 1))
+        else:
+            self.status = self.FAILED
+        self.save(update_fields=['status', 'error', 'finished_at', 'run_after'])
+
+    @classmethod
+    def requeue_stale(cls):
+        """Returns jobs left running by a crashed worker to the queue, and purges old finished jobs."""
+        now = timezone.now()
+        cls.objects.filter(
+            status=cls.RUNNING,
+            started_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT),
+        ).update(status=cls.PENDING, run_after=now)
+        cls.objects.filter(status=cls.DONE, finished_at__lt=now - timedelta(seconds=settings.JOB_RETENTION)).delete()
+
+    @classmethod
+    def retry_failed(cls):
+        return cls.objects.filter(status=cls.FAILED).update(status=cls.PENDING, attempts=0, run_after=timezone.now())
+
+    @classmethod
+    def get_counts(cls):
+        return dict(cls.objects.values_list('status').annotate(count=Count('pk')).order_by())
+
+    def _dictify_created_at(self):
+        return self.created_at.astimezone(Space.tz).isoformat()
+
+    def _dictify_finished_at(self):
+        return self.finished_at and self.finished_at.astimezone(Space.tz).isoformat()
+
+    def json(self):
+        return self.dictify('kind', 'target', 'status', 'attempts', 'error', 'created_at', 'finished_at')
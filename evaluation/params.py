@@ -1,6 +1,7 @@
 from smartdjango import Params, Validator
 
-from evaluation.models import Evaluation, Experiment
+from evaluation.models import Evaluation, Experiment, Tag
+from evaluation.validators import EvaluationErrors
 
 
 class EvaluationParams(metaclass=Params):
@@ -19,3 +20,27 @@ class ExperimentParams(metaclass=Params):
     performance: Validator
     seed: Validator
     pid: Validator
+
+
+class TagParams(metaclass=Params):
+    model_class = Tag
+
+    name: Validator
+    signatures = Validator('signatures').bool(
+        lambda x: isinstance(x, list) and all(isinstance(signature, str) for signature in x),
+        message='signatures must be a list of evaluation signatures',
+    )
+
+
+def parse_filters(value):
+    """Parses `key:value,key:value` query filters, the value may contain colons."""
+    filters = dict()
+    for item in value.split(','):
+        key, colon, item_value = item.partition(':')
+        if not colon or not key:
+            raise EvaluationErrors.INVALID_FILTERS(details=item)
+        filters[key] = item_value
+    return filters
+
+
+FILTERS = Validator('filters').default(None, as_final=True).to(parse_filters)
@@ -0,0 +1,217 @@
+import csv
+import io
+import itertools
+import json
+from typing import Iterable, Iterator, Optional, Sequence
+
+from django.http import StreamingHttpResponse
+
+from evaluation.validators import EvaluationErrors
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+
+class Renderer:
+    """
+    Writes a row-oriented result set chunk by chunk.
+
+    Rows are sequences aligned with `columns`, so callers can feed database cursors
+    directly without materializing dicts. `types` optionally maps columns to 'str', 'int',
+    'float' or 'bool' for columnar formats, which otherwise infer them from the first batch.
+    """
+    name: str
+    content_type: str
+    extension: str
+
+    def __init__(self, columns: Sequence[str], batch_size=500, types: Optional[dict] = None):
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.types = types or dict()
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def render(self, rows: Iterable[Sequence]) -> Iterator:
+        raise NotImplementedError
+
+    def render_to_string(self, rows: Iterable[Sequence]) -> str:
+        return ''.join(self.render(rows))
+
+    def response(self, rows: Iterable[Sequence], filename='export'):
+        response = StreamingHttpResponse(self.render(rows), content_type=self.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{self.extension}"'
+        return response
+
+
+class JSONRenderer(Renderer):
+    name = 'json'
+    content_type = 'application/json; encoding=utf-8'
+    extension = 'json'
+
+    def render(self, rows):
+        yield '['
+        for index, row in enumerate(rows):
+            prefix = ',' if index else ''
+            yield prefix + json.dumps(dict(zip(self.columns, row)), ensure_ascii=False)
+        yield ']'
+
+
+class NDJSONRenderer(Renderer):
+    name = 'ndjson'
+    content_type = 'application/x-ndjson; encoding=utf-8'
+    extension = 'ndjson'
+
+    def render(self, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + '\n'
+
+
+class CSVRenderer(Renderer):
+    name = 'csv'
+    content_type = 'text/csv; encoding=utf-8'
+    extension = 'csv'
+
+    def render(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns)
+        for index, row in enumerate(rows, start=1):
+            writer.writerow(row)
+            if index % self.batch_size == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+
+class LaTeXRenderer(Renderer):
+    name = 'latex'
+    content_type = 'text/plain; encoding=utf-8'
+    extension = 'tex'
+
+    def __init__(self, columns, header: Optional[Sequence[Sequence[str]]] = None, **kwargs):
+        super().__init__(columns, **kwargs)
+        self.header = header if header is not None else [self.columns]
+
+    @staticmethod
+    def format_line(line):
+        return ' & '.join('' if value is None else str(value) for value in line) + ' \\\\'
+
+    def render(self, rows):
+        # 行之间以换行分隔，末尾不追加换行
+        separator = ''
+        for line in itertools.chain(self.header, rows):
+            yield separator + self.format_line(line)
+            separator = '\n'
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose content is drained after every record batch."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class _ArrowRenderer(Renderer):
+    @classmethod
+    def available(cls):
+        return pyarrow is not None
+
+    TYPES = dict(str='string', int='int64', float='float64', bool='bool')
+
+    def open_writer(self, sink, schema):
+        raise NotImplementedError
+
+    def get_schema(self, table):
+        fields = []
+        for field in table.schema:
+            if field.name in self.types:
+                field = field.with_type(pyarrow.type_for_alias(self.TYPES[self.types[field.name]]))
+            elif pyarrow.types.is_null(field.type):
+                field = field.with_type(pyarrow.string())
+            fields.append(field)
+        return pyarrow.schema(fields)
+
+    def render(self, rows):
+        sink = _ChunkSink()
+        writer, schema = None, None
+        for batch in itertools.chain(self.batches(rows), [None]):
+            if batch is None and writer is not None:
+                break
+            arrays = list(zip(*batch)) if batch else [[] for _ in self.columns]
+            table = pyarrow.table({column: list(values) for column, values in zip(self.columns, arrays)})
+            if writer is None:
+                schema = self.get_schema(table)
+                writer = self.open_writer(sink, schema)
+            writer.write_table(table.cast(schema))
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+
+    def batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+class ParquetRenderer(_ArrowRenderer):
+    name = 'parquet'
+    content_type = 'application/vnd.apache.parquet'
+    extension = 'parquet'
+
+    def open_writer(self, sink, schema):
+        return pyarrow.parquet.ParquetWriter(sink, schema)
+
+
+class ArrowRenderer(_ArrowRenderer):
+    name = 'arrow'
+    content_type = 'application/vnd.apache.arrow.stream'
+    extension = 'arrows'
+
+    def open_writer(self, sink, schema):
+        return pyarrow.ipc.new_stream(sink, schema)
+
+
+RENDERERS = {
+    renderer.name: renderer
+    for renderer in [JSONRenderer, NDJSONRenderer, CSVRenderer, LaTeXRenderer, ParquetRenderer, ArrowRenderer]
+}
+
+
+def get_renderer(name, columns, **kwargs) -> Renderer:
+    if name not in RENDERERS:
+        raise EvaluationErrors.RENDERER_NOT_FOUND(details=name)
+    renderer = RENDERERS[name]
+    if not renderer.available():
+        raise EvaluationErrors.RENDERER_UNAVAILABLE(details=name)
+    return renderer(columns, **kwargs)
@@ -0,0 +1,200 @@
+import numpy as np
+
+from common import function, handler
+from evaluation.export import MODELS, DATASETS, METRICS
+from evaluation.models import Evaluation, Experiment
+from evaluation.validators import EvaluationErrors
+
+DIMENSION_ALIASES = {
+    'dataset': 'data',
+}
+
+LABELS = {
+    'model': MODELS,
+    'data': DATASETS,
+}
+
+
+def get_dimensions(command):
+    """All report dimensions of an evaluation: normalized params plus every raw command argument."""
+    dimensions = function.argparse(command)
+    dimensions.update(Evaluation.parse_params(command))
+    dimensions['data'] = dimensions['data'].lower().replace('rb', '') if dimensions['data'] else None
+    dimensions['model'] = dimensions['model'].lower() if dimensions['model'] else None
+    return dimensions
+
+
+def _std(values):
+    return float(np.std(values, ddof=1)) if len(values) > 1 else None
+
+
+def _pooled(runs):
+    return np.concatenate([np.asarray(values, dtype=float) for values in runs])
+
+
+# best: 按 rank_by 指标均值选出单元格内最优配置，报告其 mean ± std
+AGGREGATIONS = {
+    'best': None,
+    'mean': lambda runs: (float(np.mean(_pooled(runs))), _std(_pooled(runs))),
+    'median': lambda runs: (float(np.median(_pooled(runs))), None),
+    'min': lambda runs: (float(np.min([np.mean(values) for values in runs])), None),
+    'max': lambda runs: (float(np.max([np.mean(values) for values in runs])), None),
+    'count': lambda runs: (len(runs), None),
+}
+
+
+class Report:
+    """
+    Declarative pivot of evaluation results.
+
+    Every qualifying evaluation is placed in a (row, column) cell by its dimensions, e.g.
+    rows=['model'], columns=['dataset']. Cells are filled from a single ordered pass over
+    completed experiments, then reduced by `aggregate` over the seed-level metric values.
+    With `tag`, only the evaluations of that sweep are considered.
+    """
+
+    def __init__(self, rows, columns=None, metrics=None, aggregate='best', replicate=5, filters=None, rank_by=None, tag=None):
+        self.rows = [DIMENSION_ALIASES.get(dim, dim) for dim in rows]
+        self.columns = [DIMENSION_ALIASES.get(dim, dim) for dim in columns or []]
+        self.metrics = [metric.lower() for metric in metrics or METRICS]
+        if aggregate not in AGGREGATIONS:
+            raise EvaluationErrors.REPORT_AGGREGATION(details=aggregate)
+        self.aggregate = aggregate
+        self.replicate = replicate
+        self.filters = {DIMENSION_ALIASES.get(k, k): str(v) for k, v in (filters or {}).items()}
+        self.rank_by = (rank_by or self.metrics[0]).lower()
+        self.tag = tag
+
+    def match(self, dimensions):
+        for key, value in self.filters.items():
+            if str(dimensions.get(key)).lower() != value.lower():
+                return False
+        return True
+
+    def iter_evaluations(self, chunk_size=2000):
+        """Yields (signature, dimensions, {metric: [values per seed]}) for evaluations above the replicate threshold."""
+        experiments = Experiment.objects.filter(is_completed=True).order_by('evaluation_id').values_list(
+            'evaluation_id', 'evaluation__signature', 'evaluation__command', 'performance',
+        )
+        if self.tag:
+            experiments = experiments.filter(evaluation__tags__name=self.tag)
+        current, group = None, []
+
+        def flush():
+            if not group or len(group) < self.replicate:
+                return None
+            signature, command = group[0][0], group[0][1]
+            dimensions = get_dimensions(command)
+            if not self.match(dimensions):
+                return None
+            values = dict()
+            for _, _, performance in group:
+                performance = {k.lower(): v for k, v in handler.json_loads(performance or '{}').items()}
+                for metric in set(self.metrics) | {self.rank_by}:
+                    if metric in performance:
+                        values.setdefault(metric, []).append(performance[metric])
+            return signature, dimensions, values
+
+        for evaluation_id, *values in experiments.iterator(chunk_size=chunk_size):
+            if evaluation_id != current:
+                result = flush()
+                if result:
+                    yield result
+                current, group = evaluation_id, []
+            group.append(values)
+        result = flush()
+        if result:
+            yield result
+
+    def build(self):
+        cells = dict()
+        row_keys, column_keys = dict(), dict()
+        for signature, dimensions, values in self.iter_evaluations():
+            row = tuple(dimensions.get(dim) for dim in self.rows)
+            column = tuple(dimensions.get(dim) for dim in self.columns)
+            row_keys.setdefault(row, None)
+            column_keys.setdefault(column, None)
+            cells.setdefault((row, column), []).append((signature, values))
+
+        table = dict()
+        for (row, column), entries in cells.items():
+            table[(row, column)] = self.reduce(entries)
+
+        return dict(
+            rows=sorted(row_keys, key=lambda key: tuple(str(v) for v in key)),
+            columns=sorted(column_keys, key=lambda key: tuple(str(v) for v in key)),
+            cells=table,
+        )
+
+    def reduce(self, entries):
+        cell = dict()
+        if self.aggregate == 'best':
+            candidates = [entry for entry in entries if self.rank_by in entry[1]]
+            if not candidates:
+                return cell
+            index = int(np.argmax([np.mean(values[self.rank_by]) for _, values in candidates]))
+            signature, values = candidates[index]
+            for metric in self.metrics:
+                if metric in values:
+                    cell[metric] = dict(value=float(np.mean(values[metric])), std=_std(values[metric]), signature=signature)
+            return cell
+
+        for metric in self.metrics:
+            runs = [values[metric] for _, values in entries if metric in values]
+            if runs:
+                value, std = AGGREGATIONS[self.aggregate](runs)
+                cell[metric] = dict(value=value, std=std)
+        return cell
+
+    @staticmethod
+    def label(dim, value):
+        return LABELS.get(dim, {}).get(value, value)
+
+    def json(self):
+        report = self.build()
+        return dict(
+            rows=self.rows,
+            columns=self.columns,
+            metrics=self.metrics,
+            aggregate=self.aggregate,
+            table=[
+                dict(
+                    row=dict(zip(self.rows, row)),
+                    cells=[
+                        dict(column=dict(zip(self.columns, column)), metrics=report['cells'].get((row, column), {}))
+                        for column in report['columns']
+                    ],
+                )
+                for row in report['rows']
+            ],
+        )
+
+    def tabulate(self, pretty=False):
+        """Wide table: row dimensions followed by one (value, std) pair per column and metric."""
+        report = self.build()
+        header = list(self.rows)
+        for column in report['columns']:
+            name = '/'.join(str(self.label(dim, v)) for dim, v in zip(self.columns, column))
+            for metric in self.metrics:
+                prefix = f'{name}:{metric}' if name else metric
+                header.extend([prefix] if pretty else [prefix, f'{prefix}:std'])
+
+        def rows():
+            for row in report['rows']:
+                line = [self.label(dim, v) if pretty else v for dim, v in zip(self.rows, row)]
+                for column in report['columns']:
+                    cell = report['cells'].get((row, column), {})
+                    for metric in self.metrics:
+                        value, std = cell.get(metric, {}).get('value'), cell.get(metric, {}).get('std')
+                        if not pretty:
+                            line.extend([value, std])
+                        elif value is None:
+                            line.append('')
+                        elif std is None or self.aggregate == 'count':
+                            line.append(f'{value * 100:.2f}' if self.aggregate != 'count' else str(value))
+                        else:
+                            line.append(f'{value * 100:.2f} $\\pm$ {std * 100:.2f}')
+                yield line
+
+        types = {column: 'float' for column in header[len(self.rows):]}
+        return header, rows(), types
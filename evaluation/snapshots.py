@@ -0,0 +1,95 @@
+import time
+
+from django.conf import settings
+
+from common.routers import read_live
+from evaluation.export import get_top_rank_models_per_datasets
+from evaluation.models import Experiment, Snapshot
+
+
+def compute_snapshot(replicate=5, metrics=None, datasets=None, top_k=1, version=None):
+    # 先取版本再计算，计算期间的新结果会让下一次刷新重新计算
+    # 存储的快照始终来自主库，不能由（可能更旧的）分析快照计算
+    with read_live():
+        version = version or Experiment.get_results_version()[0]
+        start = time.perf_counter()
+        results = get_top_rank_models_per_datasets(replicate, metrics, datasets, top_k=top_k)
+    return Snapshot.store(results, version, time.perf_counter() - start, replicate, metrics, datasets, top_k)
+
+
+def get_configured_snapshots():
+    """Parameters of the LEADERBOARD_SNAPSHOTS, the only combinations stored as snapshots."""
+    configured = []
+    for params in getattr(settings, 'LEADERBOARD_SNAPSHOTS', []):
+        params = dict(params)
+        params.setdefault('replicate', 5)
+        params.setdefault('top_k', 1)
+        configured.append(params)
+    return configured
+
+
+def get_snapshot_params(replicate=5, metrics=None, datasets=None, top_k=1):
+    """The configured snapshot covering a request, possibly with a larger top_k, or None."""
+    key = Snapshot.get_key(replicate, metrics, datasets, top_k)
+    top_k = key.pop('top_k')
+    for params in get_configured_snapshots():
+        configured = Snapshot.get_key(**params)
+        if configured.pop('top_k') >= top_k and configured == key:
+            return params
+    return None
+
+
+def refresh_snapshots(force=False):
+    """
+    Recomputes the configured LEADERBOARD_SNAPSHOTS and deletes stored snapshots no longer configured.
+
+    Snapshots whose results version is unchanged are skipped unless `force` is set.
+    Returns the refreshed snapshots.
+    """
+    version = Experiment.get_results_version()[0]
+    targets = {tuple(Snapshot.get_key(**params).values()): (params, None) for params in get_configured_snapshots()}
+    stale = []
+    for snapshot in Snapshot.objects.defer('results'):
+        key = tuple(Snapshot.get_key(**snapshot.get_params()).values())
+        if key in targets:
+            targets[key] = (targets[key][0], snapshot.version)
+        else:
+            stale.append(snapshot.pk)
+    Snapshot.objects.filter(pk__in=stale).delete()
+
+    refreshed = []
+    for params, current in targets.values():
+        if force or current != version:
+            refreshed.append(compute_snapshot(**params, version=version))
+    return refreshed
+
+
+def get_served_snapshot(replicate=5, metrics=None, datasets=None, top_k=1, live=False, **options):
+    """The stored snapshot `get_leaderboard` serves as is, or None when the results are computed."""
+    if live or any(options.values()):
+        return None
+    params = get_snapshot_params(replicate, metrics, datasets, top_k)
+    if params is None:
+        return None
+    return Snapshot.get_latest(**params)
+
+
+def get_leaderboard(replicate=5, metrics=None, datasets=None, top_k=1, live=False, **options):
+    """
+    Top-rank results with the snapshot they come from.
+
+    Requests covered by LEADERBOARD_SNAPSHOTS are served from the latest snapshot as is; it is
+    (re)computed and stored only when `live` is asked for or it does not exist yet. Any other
+    combination, and ranking `options` (tiebreak, per_model, with_ties), are computed on the
+    fly without a snapshot, so clients cannot grow the stored snapshots.
+    """
+    if any(options.values()):
+        return get_top_rank_models_per_datasets(replicate, metrics, datasets, top_k=top_k, **options), None
+
+    snapshot = get_served_snapshot(replicate, metrics, datasets, top_k, live)
+    if snapshot is None:
+        params = get_snapshot_params(replicate, metrics, datasets, top_k)
+        if params is None:
+            return get_top_rank_models_per_datasets(replicate, metrics, datasets, top_k=top_k), None
+        snapshot = compute_snapshot(**params)
+    return snapshot.get_results(top_k), snapshot
@@ -1,3 +1,612 @@
-from django.test import TestCase
+import gzip
+import json
+import random
+import tempfile
+import zlib
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from smartdjango import Error
+
+from common import function
+from common.middleware import CompressionMiddleware, get_compressors, msgpack, negotiate_encoding, zstandard
+from config.models import Config
+from evaluation import jobs
+from evaluation.dump import dump_partition
+from evaluation.export import TopK
+from evaluation.models import Evaluation, Experiment, Job, Snapshot, Tag
+from evaluation.params import parse_filters
+from evaluation.snapshots import get_leaderboard, refresh_snapshots
+from evaluation.validators import EvaluationErrors
+
+
+def top_k_reference(k, pushes, with_ties=False, per_model=False):
+    """Brute force: best entry per model, sorted by key then push order, plus entries tied with the k-th."""
+    best = dict()
+    for index, (key, item) in enumerate(pushes):
+        unique = item if per_model else index
+        entry = (key, -index, item)
+        if unique not in best or entry[:2] > best[unique][:2]:
+            best[unique] = entry
+    entries = sorted(best.values(), reverse=True)
+    selected = entries[:k]
+    if with_ties and len(entries) > k:
+        selected += [entry for entry in entries[k:] if entry[0] == selected[-1][0]]
+    return [entry[2] for entry in selected]
+
+
+class TopKTests(SimpleTestCase):
+    @staticmethod
+    def run_pushes(k, pushes, with_ties=False, per_model=False):
+        top = TopK(k, with_ties=with_ties)
+        for key, item in pushes:
+            top.push(key, item, unique=item if per_model else None)
+        return top.items()
+
+    def test_keeps_k_largest_in_order(self):
+        pushes = [(0.3, 'a'), (0.9, 'b'), (0.1, 'c'), (0.5, 'd'), (0.7, 'e')]
+        self.assertEqual(self.run_pushes(3, pushes), ['b', 'e', 'd'])
+
+    def test_fewer_entries_than_k(self):
+        self.assertEqual(self.run_pushes(5, [(0.2, 'a'), (0.4, 'b')]), ['b', 'a'])
+        self.assertEqual(self.run_pushes(2, []), [])
+
+    def test_equal_keys_rank_by_push_order(self):
+        self.assertEqual(self.run_pushes(2, [(0.5, 'a'), (0.5, 'b'), (0.5, 'c')]), ['a', 'b'])
+
+    def test_with_ties_keeps_entries_tied_with_kth(self):
+        pushes = [(0.5, 'a'), (0.9, 'b'), (0.5, 'c'), (0.1, 'd'), (0.5, 'e')]
+        self.assertEqual(self.run_pushes(2, pushes, with_ties=True), ['b', 'a', 'c', 'e'])
+
+    def test_with_ties_drops_ties_below_new_kth(self):
+        pushes = [(0.5, 'a'), (0.5, 'b'), (0.7, 'c')]
+        self.assertEqual(self.run_pushes(1, pushes, with_ties=True), ['c'])
+
+    def test_per_model_keeps_best_entry(self):
+        pushes = [(0.5, 'a'), (0.3, 'b'), (0.9, 'a'), (0.4, 'c'), (0.2, 'a')]
+        self.assertEqual(self.run_pushes(2, pushes, per_model=True), ['a', 'c'])
+
+    def test_per_model_replacement_refilters_ties(self):
+        pushes = [(0.1, 'b'), (0.1, 'a'), (0.3, 'b')]
+        self.assertEqual(self.run_pushes(1, pushes, with_ties=True, per_model=True), ['b'])
+
+    def test_per_model_replacement_keeps_ties_with_unchanged_kth(self):
+        pushes = [(0.1, 'a'), (0.1, 'b'), (0.1, 'c'), (0.3, 'b')]
+        self.assertEqual(self.run_pushes(2, pushes, with_ties=True, per_model=True), ['b', 'a', 'c'])
+
+    def test_matches_reference(self):
+        for seed in range(3000):
+            rng = random.Random(seed)
+            k = rng.randint(1, 4)
+            with_ties, per_model = rng.random() < 0.5, rng.random() < 0.5
+            pushes = [(rng.choice([0.1, 0.2, 0.3, 0.4]), rng.choice('abcdef')) for _ in range(rng.randint(0, 12))]
+            with self.subTest(seed=seed):
+                self.assertEqual(
+                    self.run_pushes(k, pushes, with_ties, per_model),
+                    top_k_reference(k, pushes, with_ties, per_model),
+                )
+
+
+class ExperimentCompleteTests(TestCase):
+    def setUp(self):
+        evaluation = Evaluation.create('sig', 'python trainer.py --model dcn --lr 0.001', '{}')
+        self.experiment = Experiment.create(evaluation, seed=2024)
+
+    def complete(self, experiment):
+        experiment.complete(log='epoch 1', performance='{"auc": 0.7}')
+
+    def test_completes_and_queues_summary(self):
+        self.complete(self.experiment)
+        experiment = Experiment.objects.get(pk=self.experiment.pk)
+        self.assertTrue(experiment.is_completed)
+        self.assertIsNotNone(experiment.completed_at)
+        self.assertEqual(Job.objects.filter(kind=Job.SUMMARIZE, target=experiment.session).count(), 1)
+
+    def test_double_completion_is_rejected(self):
+        self.complete(self.experiment)
+        with self.assertRaises(Error) as context:
+            self.complete(self.experiment)
+        self.assertEqual(context.exception, EvaluationErrors.ALREADY_COMPLETED)
+        self.assertEqual(Job.objects.filter(kind=Job.SUMMARIZE, target=self.experiment.session).count(), 1)
+
+    def test_concurrent_completion_is_rejected(self):
+        # 两个请求读到的都是未完成的实验，只有条件更新成功的一方生效
+        first = Experiment.objects.get(pk=self.experiment.pk)
+        second = Experiment.objects.get(pk=self.experiment.pk)
+        self.complete(first)
+        with self.assertRaises(Error) as context:
+            second.complete(log='other', performance='{"auc": 0.1}')
+        self.assertEqual(context.exception, EvaluationErrors.ALREADY_COMPLETED)
+        self.assertFalse(second.is_completed)
+
+        experiment = Experiment.objects.get(pk=self.experiment.pk)
+        self.assertEqual(experiment.log, 'epoch 1')
+        self.assertEqual(Job.objects.filter(kind=Job.SUMMARIZE, target=experiment.session).count(), 1)
+
+
+class DigestTests(SimpleTestCase):
+    def test_configuration_key_ignores_key_order_and_whitespace(self):
+        key = function.get_configuration_key('{"model": {"name": "dcn", "layers": 3}, "lr": 0.001}')
+        self.assertEqual(key, function.get_configuration_key('{"lr":0.001,"model":{"layers":3,"name":"dcn"}}'))
+        self.assertEqual(key, function.get_configuration_key('{\n  "lr": 0.001,\n  "model": {"layers": 3.0, "name": "dcn"}\n}'))
+        self.assertNotEqual(key, function.get_configuration_key('{"lr": 0.01, "model": {"name": "dcn", "layers": 3}}'))
+
+    def test_command_key_ignores_argument_order_and_whitespace(self):
+        key = function.get_command_key('python trainer.py --model dcn --lr 0.001 --batch_size 5000')
+        self.assertEqual(key, function.get_command_key('python trainer.py --batch_size 5000 --lr 0.001 --model dcn'))
+        self.assertEqual(key, function.get_command_key('  python  trainer.py --lr 0.001\t--model dcn --batch_size   5000 '))
+        self.assertNotEqual(key, function.get_command_key('python trainer.py --model dcn --lr 0.01 --batch_size 5000'))
+        self.assertNotEqual(key, function.get_command_key('python other.py --model dcn --lr 0.001 --batch_size 5000'))
+
+    def test_unparsable_command_falls_back_to_text(self):
+        self.assertEqual(function.get_command_key('bash run.sh  dcn'), function.get_command_key('bash run.sh dcn'))
+        self.assertNotEqual(function.get_command_key('bash run.sh dcn'), function.get_command_key('bash dcn run.sh'))
+
+
+class EvaluationLookupTests(TestCase):
+    command = 'python trainer.py --model dcn --lr 0.001'
+
+    def test_finds_evaluation_regardless_of_argument_order(self):
+        evaluation = Evaluation.create('sig', self.command, '{}')
+        self.assertEqual(Evaluation.get_by_command('python trainer.py --lr 0.001  --model dcn'), evaluation)
+
+    def test_falls_back_to_legacy_row_without_key(self):
+        # 旧版本创建、尚未回填摘要的记录
+        legacy = Evaluation.objects.create(signature='legacy', command=self.command, configuration='{"a": 1}', command_key=None)
+        self.assertEqual(Evaluation.get_by_command(self.command), legacy)
+
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.command_key, function.get_command_key(self.command))
+        self.assertEqual(legacy.configuration_key, function.get_configuration_key('{"a": 1}'))
+        # 回填后按摘要即可找到，参数顺序不同也一样
+        self.assertEqual(Evaluation.get_by_command('python trainer.py --lr 0.001 --model dcn'), legacy)
+
+    def test_missing_command_raises(self):
+        Evaluation.objects.create(signature='legacy', command=self.command, configuration='{}', command_key=None)
+        with self.assertRaises(Evaluation.DoesNotExist):
+            Evaluation.get_by_command('python trainer.py --model dcn --lr 0.01')
+
+
+class AuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_rejects_requests_while_no_token_is_configured(self):
+        self.assertEqual(self.client.get('/log-summarize').status_code, 401)
+        self.assertEqual(self.client.get('/log-summarize', HTTP_AUTHENTICATION='').status_code, 401)
+
+    def test_accepts_configured_token_only(self):
+        Config.set('auth', 'token')
+        self.assertEqual(self.client.get('/log-summarize').status_code, 401)
+        self.assertEqual(self.client.get('/log-summarize', HTTP_AUTHENTICATION='other').status_code, 401)
+        self.assertEqual(self.client.get('/log-summarize', HTTP_AUTHENTICATION='token').status_code, 200)
+
+
+# 旧版本 `migrate --run-syncdb` 建出的表
+BASELINE_SCHEMA = [
+    'CREATE TABLE "evaluation_evaluation" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+    '"signature" varchar(10) NOT NULL UNIQUE, "command" text NOT NULL UNIQUE, "configuration" text NOT NULL, '
+    '"created_at" datetime NOT NULL, "modified_at" datetime NOT NULL, "comment" text NOT NULL)',
+    'CREATE TABLE "evaluation_experiment" ("id" integer NOT NULL PRIMARY KEY AUTOINCREMENT, '
+    '"evaluation_id" bigint NOT NULL REFERENCES "evaluation_evaluation" ("id") DEFERRABLE INITIALLY DEFERRED, '
+    '"seed" integer NOT NULL, "session" varchar(32) NOT NULL UNIQUE, "log" text NULL, "performance" text NULL, '
+    '"pid" integer NULL, "is_completed" bool NOT NULL, "created_at" datetime NOT NULL, "completed_at" datetime NOT NULL, '
+    '"data_start_time" integer NULL, "data_final_time" integer NULL, "data_prep_time" integer NULL, '
+    '"data_total_epochs" integer NULL, "data_epoch_durations" text NULL, "data_valid_metrics" text NULL)',
+    'CREATE INDEX "evaluation_experiment_evaluation_id_94f5972e" ON "evaluation_experiment" ("evaluation_id")',
+]
+
+
+class UpgradeSchemaTests(TransactionTestCase):
+    command = 'python trainer.py --model dcn --lr 0.001'
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            for table in ('evaluation_job', 'evaluation_snapshot', 'evaluation_experiment', 'evaluation_evaluation'):
+                cursor.execute(f'DROP TABLE "{table}"')
+            for statement in BASELINE_SCHEMA:
+                cursor.execute(statement)
+            cursor.execute(
+                'INSERT INTO evaluation_evaluation VALUES (1, %s, %s, %s, %s, %s, %s)',
+                ['sig', self.command, '{}', '2024-01-01 00:00:00', '2024-01-01 00:00:00', ''],
+            )
+            cursor.execute(
+                'INSERT INTO evaluation_experiment (id, evaluation_id, seed, session, log, performance, pid, '
+                'is_completed, created_at, completed_at) VALUES (1, 1, 2024, %s, %s, %s, 1, 1, %s, %s)',
+                ['session', 'epoch 1', '{"auc": 0.7}', '2024-01-01 00:00:00', '2024-01-02 00:00:00'],
+            )
+
+    def upgrade(self):
+        output = StringIO()
+        call_command('upgrade_schema', stdout=output)
+        return output.getvalue()
+
+    def test_keeps_existing_rows(self):
+        output = self.upgrade()
+        self.assertIn('added column evaluation_experiment.is_failed', output)
+        self.assertIn('created table evaluation_job', output)
+        self.assertIn('dropped unique constraint on evaluation_evaluation.command', output)
+
+        experiment = Experiment.objects.get(pk=1)
+        self.assertEqual((experiment.session, experiment.log, experiment.seed), ('session', 'epoch 1', 2024))
+        self.assertIs(experiment.is_failed, False)
+        self.assertIsNone(experiment.last_seen)
+        self.assertEqual(experiment.log_archive, '')
+        self.assertIsNone(experiment.log_offset)
+        self.assertIsNone(experiment.log_length)
+
+        evaluation = Evaluation.objects.get(pk=1)
+        self.assertEqual((evaluation.signature, evaluation.command), ('sig', self.command))
+        self.assertIsNone(evaluation.command_key)
+        self.assertEqual(evaluation.configuration_key, '')
+        self.assertEqual(self.client.get('/evaluations/sig').status_code, 200)
+
+    def test_upgraded_schema_is_usable(self):
+        self.upgrade()
+        self.assertIn('Schema is up to date', self.upgrade())
+
+        call_command('backfill_evaluation_keys', stdout=StringIO())
+        self.assertEqual(Evaluation.get_by_command('python trainer.py --lr 0.001 --model dcn').pk, 1)
+        # command 不再唯一，command_key 仍然唯一
+        Evaluation.objects.create(signature='other', command=self.command, configuration='{}')
+        with self.assertRaises(Error):
+            Evaluation.create('third', 'python trainer.py --lr 0.001 --model dcn', '{}')
+        Job.enqueue(Job.SUMMARIZE, 'session')
+        self.assertEqual(Job.objects.count(), 1)
+
+
+class ResultsVersionTests(TestCase):
+    def version(self):
+        with self.assertNumQueries(1):
+            return Experiment.get_results_version()[0]
+
+    def write(self, func, *args, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return func(*args, **kwargs)
+
+    def test_is_a_single_lookup_and_stable_without_writes(self):
+        Experiment.get_results_version()
+        self.assertEqual(self.version(), self.version())
+
+    def test_changes_on_every_result_write(self):
+        versions = [Experiment.get_results_version()[0]]
+        evaluation = self.write(Evaluation.create, 'sig', 'python trainer.py --model dcn', '{}')
+        versions.append(self.version())
+        experiment = self.write(Experiment.create, evaluation, 2024)
+        versions.append(self.version())
+        self.write(experiment.complete, log='epoch 1', performance='{"auc": 0.7}')
+        versions.append(self.version())
+        self.write(evaluation.delete)
+        versions.append(self.version())
+        self.assertEqual(len(set(versions)), len(versions))
+
+    def test_heartbeat_keeps_version(self):
+        evaluation = self.write(Evaluation.create, 'sig', 'python trainer.py --model dcn', '{}')
+        experiment = self.write(Experiment.create, evaluation, 2024)
+        version = self.version()
+        self.write(Experiment.heartbeat, experiment.session)
+        self.assertEqual(self.version(), version)
+
+
+@override_settings(LEADERBOARD_SNAPSHOTS=[dict(replicate=5, top_k=3)], ANALYTICS_DATABASE=None)
+class SnapshotTests(TestCase):
+    def test_stores_configured_combinations_only(self):
+        _, snapshot = get_leaderboard(replicate=5, top_k=1)
+        self.assertEqual(snapshot.get_params(), dict(replicate=5, metrics=None, datasets=None, top_k=3))
+        self.assertEqual(get_leaderboard(replicate=5, top_k=2)[1], snapshot)
+
+        for params in (dict(replicate=3), dict(top_k=5), dict(metrics=['gauc']), dict(datasets=['books'])):
+            with self.subTest(**params):
+                results, snapshot = get_leaderboard(**params)
+                self.assertIsNone(snapshot)
+        self.assertEqual(Snapshot.objects.count(), 1)
+
+    def test_refresh_drops_unconfigured_snapshots(self):
+        Snapshot.store({}, 'old', 0, replicate=3, datasets=['books'], top_k=1)
+        refreshed = refresh_snapshots()
+        self.assertEqual([snapshot.get_params()['top_k'] for snapshot in refreshed], [3])
+        self.assertEqual(list(Snapshot.objects.values_list('replicate', 'top_k')), [(5, 3)])
+        self.assertEqual(refresh_snapshots(), [])
+
+
+class CompareTests(TestCase):
+    def test_rejects_repeated_signatures(self):
+        for signatures in ('s1,s1', 's1,s2,s1'):
+            with self.subTest(signatures=signatures):
+                response = self.client.get('/evaluations/compare', dict(signatures=signatures))
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['identifier'], 'EVALUATION@COMPARISON_DUPLICATE')
+
+
+class FilterTests(TestCase):
+    def test_parses_key_value_pairs(self):
+        self.assertEqual(parse_filters('model:dcn,lr:0.001'), dict(model='dcn', lr='0.001'))
+        self.assertEqual(parse_filters('data:config/a:b.yaml'), dict(data='config/a:b.yaml'))
+
+    def test_views_reject_malformed_filters(self):
+        for url in ('/evaluations/report', '/evaluations/throughput'):
+            for filters in ('foo', 'model:dcn,', ':dcn'):
+                with self.subTest(url=url, filters=filters):
+                    response = self.client.get(url, dict(filters=filters))
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json()['identifier'], 'EVALUATION@INVALID_FILTERS')
+
+
+class DumpTests(TestCase):
+    def setUp(self):
+        evaluation = Evaluation.create('sig', 'python trainer.py --model dcn', '{}')
+        self.experiment = Experiment.create(evaluation, seed=2024)
+        Experiment.objects.filter(pk=self.experiment.pk).update(
+            log=None, log_archive='2024-01.pack', log_offset=0, log_length=10, is_completed=True,
+        )
+
+    def dump_experiments(self, logs):
+        with tempfile.TemporaryDirectory() as directory:
+            partition = dump_partition('experiment', dict(index=0, start=self.experiment.pk, end=None), directory, 'ndjson', logs)
+            with gzip.open(f'{directory}/{partition["file"]}', 'rt', encoding='utf-8') as f:
+                return [json.loads(line) for line in f]
+
+    def test_dump_without_logs_drops_archive_pointers(self):
+        row, = self.dump_experiments(logs=False)
+        for column in ('log', 'log_archive', 'log_offset', 'log_length'):
+            self.assertNotIn(column, row)
+        self.assertEqual(row['session'], self.experiment.session)
+
+
+@override_settings(REQUEST_MAX_DECOMPRESSED_SIZE=4096)
+class RequestDecompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Config.set('auth', 'token')
+
+    def post(self, body, encoding, url='/evaluations/', **headers):
+        return self.client.post(
+            url, body, content_type='application/json',
+            HTTP_CONTENT_ENCODING=encoding, HTTP_AUTHENTICATION='token', **headers,
+        )
+
+    @staticmethod
+    def evaluation(signature='sig', comment=''):
+        return json.dumps(dict(
+            signature=signature, command=f'python trainer.py --model dcn {comment}'.strip(), configuration='{}',
+        )).encode()
+
+    def test_accepts_gzip_bodies(self):
+        response = self.post(gzip.compress(self.evaluation()), 'gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Evaluation.objects.get().signature, 'sig')
+
+    @skipIf(zstandard is None, 'zstandard is not installed')
+    def test_accepts_zstd_bodies(self):
+        response = self.post(zstandard.ZstdCompressor().compress(self.evaluation()), 'zstd')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Evaluation.objects.get().signature, 'sig')
+
+    def test_rejects_bodies_above_the_cap(self):
+        body = self.evaluation(comment='--note ' + 'x' * 5000)
+        response = self.post(gzip.compress(body), 'gzip')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['identifier'], 'REQUEST@BODY_TOO_LARGE')
+        self.assertFalse(Evaluation.objects.exists())
+
+    def test_rejects_corrupted_bodies(self):
+        for body in (b'not gzip at all', gzip.compress(self.evaluation())[:-12]):
+            with self.subTest(body=body[:10]):
+                response = self.post(body, 'gzip')
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['identifier'], 'REQUEST@CORRUPTED_BODY')
+
+    def test_rejects_unsupported_encodings(self):
+        response = self.post(zlib.compress(self.evaluation()), 'deflate')
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(response.json()['identifier'], 'REQUEST@UNSUPPORTED_ENCODING')
+
+    def test_only_allowlisted_views_decompress(self):
+        experiment = Experiment.create(Evaluation.create('sig', 'python trainer.py', '{}'), seed=0)
+        response = self.post(gzip.compress(b'{}'), 'gzip', url=f'/experiments/{experiment.session}/heartbeat')
+        self.assertEqual(response.status_code, 415)
+
+    def test_errors_carry_cors_headers(self):
+        response = self.post(b'not gzip at all', 'gzip', HTTP_ORIGIN='https://example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Access-Control-Allow-Origin', response.headers)
+
+
+class CompressionTests(SimpleTestCase):
+    body = json.dumps([dict(signature=f'sig{i}', command='python trainer.py --model dcn') for i in range(100)]).encode()
+
+    def compress(self, response, accept_encoding='gzip'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda _: response)(request)
+
+    def test_negotiates_by_q_value(self):
+        compressors = dict.fromkeys(['zstd', 'br', 'gzip'])
+        self.assertEqual(negotiate_encoding('gzip;q=0.5, br;q=0.8', compressors), 'br')
+        self.assertEqual(negotiate_encoding('zstd;q=0, gzip', compressors), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip, zstd, br', compressors), 'zstd')
+        self.assertEqual(negotiate_encoding('*;q=0.1, gzip;q=0', compressors), 'zstd')
+        self.assertEqual(negotiate_encoding('gzip;q=abc', compressors), None)
+        self.assertIsNone(negotiate_encoding('identity', compressors))
+        self.assertIsNone(negotiate_encoding('', compressors))
+
+    def test_compresses_and_weakens_strong_etag(self):
+        response = HttpResponse(self.body)
+        response['ETag'] = '"abc"'
+        response = self.compress(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_keeps_weak_etag(self):
+        response = HttpResponse(self.body)
+        response['ETag'] = 'W/"abc"'
+        self.assertEqual(self.compress(response)['ETag'], 'W/"abc"')
+
+    def test_leaves_small_and_unmodified_responses(self):
+        response = self.compress(HttpResponse(b'{}'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.compress(HttpResponse(self.body, status=304))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.compress(HttpResponse(self.body), accept_encoding='')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_compresses_streams_chunk_by_chunk(self):
+        chunks = [self.body[i:i + 1000] for i in range(0, len(self.body), 1000)]
+        response = self.compress(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body)
+
+    @skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd_round_trip(self):
+        self.assertIn('zstd', get_compressors())
+        response = self.compress(HttpResponse(self.body), accept_encoding='zstd')
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(response.content), self.body)
+
+
+class ResponseEncodingTests(TestCase):
+    def test_compresses_api_responses(self):
+        for index in range(50):
+            Tag.create_or_get(f'sweep-{index:02d}')
+        plain = self.client.get('/tags/')
+        response = self.client.get('/tags/', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_encodes_envelope_as_msgpack(self):
+        Tag.create_or_get('sweep')
+        response = self.client.get('/tags/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertIn('Accept', response['Vary'])
+        envelope = msgpack.unpackb(response.content)
+        self.assertEqual(envelope['identifier'], 'OK')
+        self.assertEqual(envelope['body'], json.loads(self.client.get('/tags/').content)['body'])
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_encodes_errors_as_msgpack(self):
+        response = self.client.get('/tags/missing', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(msgpack.unpackb(response.content)['identifier'], 'EVALUATION@TAG_NOT_FOUND')
+
+
+@override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_DELAY=30, JOB_TIMEOUT=600, JOB_RETENTION=3600)
+class JobTests(TestCase):
+    def age(self, job, **fields):
+        """Moves the timestamps of a job into the past, as if time had passed."""
+        Job.objects.filter(pk=job.pk).update(**{
+            field: timezone.now() - timedelta(seconds=seconds) for field, seconds in fields.items()
+        })
+
+    def test_claims_due_jobs_in_order_once(self):
+        later = Job.enqueue(Job.SUMMARIZE, 'later', delay=60)
+        first, second = Job.enqueue(Job.SUMMARIZE, 'a'), Job.enqueue(Job.SUMMARIZE, 'b')
+        self.assertEqual([Job.claim().pk, Job.claim().pk], [first.pk, second.pk])
+        self.assertIsNone(Job.claim())
+
+        job = Job.objects.get(pk=first.pk)
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        self.assertEqual(Job.objects.get(pk=later.pk).status, Job.PENDING)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        Job.enqueue(Job.SUMMARIZE, 'missing-session')
+        for attempt, delay in ((1, 30), (2, 60)):
+            self.assertEqual(jobs.run_pending(), 1)
+            job = Job.objects.get()
+            self.assertEqual((job.status, job.attempts), (Job.PENDING, attempt))
+            self.assertIn('EXP_NOT_FOUND', job.error)
+            self.assertEqual(job.run_after - job.finished_at, timedelta(seconds=delay))
+            # 重试时间未到，不会被领取
+            self.assertEqual(jobs.run_pending(), 0)
+            self.age(job, run_after=1)
+
+        self.assertEqual(jobs.run_pending(), 1)
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertEqual(Job.retry_failed(), 1)
+        self.assertEqual(Job.objects.get().attempts, 0)
+
+    def test_requeues_stale_running_jobs_and_purges_old_ones(self):
+        stale, running, old, recent = (Job.enqueue(Job.SUMMARIZE, target) for target in ('stale', 'running', 'old', 'recent'))
+        Job.objects.filter(pk__in=[stale.pk, running.pk]).update(status=Job.RUNNING, started_at=timezone.now())
+        Job.objects.filter(pk__in=[old.pk, recent.pk]).update(status=Job.DONE, finished_at=timezone.now())
+        self.age(stale, started_at=601)
+        self.age(old, finished_at=3601)
+
+        Job.requeue_stale()
+        self.assertEqual(dict(Job.objects.values_list('target', 'status')), dict(
+            stale=Job.PENDING, running=Job.RUNNING, recent=Job.DONE,
+        ))
+
+    def test_deduplicates_active_jobs(self):
+        job = Job.enqueue(Job.REFRESH_SNAPSHOTS, unique=True)
+        self.assertEqual(Job.enqueue(Job.REFRESH_SNAPSHOTS, unique=True), job)
+
+        Job.enqueue(Job.SUMMARIZE, 'pending')
+        Job.objects.filter(pk=Job.enqueue(Job.SUMMARIZE, 'running').pk).update(status=Job.RUNNING)
+        Job.objects.filter(pk=Job.enqueue(Job.SUMMARIZE, 'done').pk).update(status=Job.DONE)
+        self.assertEqual(Job.enqueue_many(Job.SUMMARIZE, ['pending', 'running', 'done', 'new', 'new']), 2)
+        self.assertEqual(Job.enqueue_many(Job.SUMMARIZE, ['pending', 'running', 'done', 'new']), 0)
+        self.assertEqual(Job.objects.filter(kind=Job.SUMMARIZE, status=Job.PENDING).count(), 3)
+
+    @override_settings(JOB_MAINTENANCE_INTERVAL=300)
+    def test_maintenance_is_throttled(self):
+        queue = jobs.JobQueue()
+        with mock.patch.object(Job, 'requeue_stale') as requeue_stale:
+            queue.maintain()
+            queue.maintain()
+            self.assertEqual(requeue_stale.call_count, 1)
+            queue.maintained_at -= 301
+            queue.maintain()
+            self.assertEqual(requeue_stale.call_count, 2)
+
+
+LOG = """[00:00:00] START TIME: 2024-01-01 10:00:00.123456
+[00:00:05] |Trainer| use single lr: 0.001
+[00:01:05] |BaseLego| [epoch 0] GAUC 0.7000
+[00:02:07] |BaseLego| [epoch 1] GAUC 0.7100
+[00:03:10] done"""
+
+
+class ArchiveLogsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(LOG_ARCHIVE_DIR=directory.name, LOG_RETENTION_DAYS=30))
+        evaluation = Evaluation.create('sig', 'python trainer.py --model dcn', '{}')
+        self.experiments = []
+        for seed, days in enumerate((60, 45, 1)):
+            experiment = Experiment.create(evaluation, seed)
+            experiment.complete(log=f'{LOG}\nseed {seed}', performance='{"auc": 0.7}')
+            Experiment.objects.filter(pk=experiment.pk).update(completed_at=timezone.now() - timedelta(days=days))
+            self.experiments.append(experiment)
+
+    def test_archived_logs_read_back(self):
+        call_command('archive_logs', stdout=StringIO())
+        old, older, recent = (Experiment.objects.get(pk=experiment.pk) for experiment in self.experiments)
+        for seed, experiment in enumerate((old, older)):
+            self.assertIsNone(experiment.log)
+            self.assertTrue(experiment.log_archive)
+            self.assertEqual(experiment.get_log(), f'{LOG}\nseed {seed}')
+        self.assertEqual(recent.log, f'{LOG}\nseed 2')
+        self.assertEqual(recent.log_archive, '')
+
+        response = self.client.get('/experiments/log', dict(session=old.session))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('seed 0', ''.join(response.json()['body']))
+
+        old.summarize()
+        self.assertEqual(Experiment.objects.get(pk=old.pk).data_total_epochs, 2)
+        output = StringIO()
+        call_command('archive_logs', stdout=output)
+        self.assertIn('Archived 0 log(s)', output.getvalue())
@@ -0,0 +1,159 @@
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from common import handler
+from evaluation.models import Experiment
+from evaluation.report import get_dimensions
+
+GROUP_BY = ('model', 'data', 'batch_size')
+
+# 1.4826 * MAD 是正态分布下标准差的一致估计
+MAD_SCALE = 1.4826
+
+
+def grouped_quantile(values, groups, n_groups, q):
+    """Linear-interpolated `q` quantile of `values` within each group, NaN for empty groups."""
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    result = np.full(n_groups, np.nan)
+    present = counts > 0
+    position = starts[present] + q * (counts[present] - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.ceil(position).astype(int)
+    result[present] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return result
+
+
+def _float(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+class Throughput:
+    """
+    Training throughput per (model, dataset, batch_size), from the summaries `Experiment.summarize` stores.
+
+    Experiments completed within the last `days` are checked against the historical baseline of
+    their group, i.e. the runs completed before. A run regresses when its median epoch time is more
+    than `threshold` slower than the baseline median and `z` robust standard deviations (MAD) above it.
+    """
+
+    def __init__(self, days=7, threshold=0.2, z=3., min_baseline=3, tag=None, filters=None):
+        self.since = timezone.now() - timedelta(days=days)
+        self.threshold = threshold
+        self.z = z
+        self.min_baseline = min_baseline
+        self.tag = tag
+        self.filters = {('data' if k == 'dataset' else k): str(v).lower() for k, v in (filters or {}).items()}
+
+    def match(self, dimensions):
+        return all(str(dimensions.get(key)).lower() == value for key, value in self.filters.items())
+
+    def load(self, chunk_size=2000):
+        """Flat arrays over all summarized experiments, epochs are concatenated and point back to their run."""
+        experiments = Experiment.objects.filter(is_completed=True, data_epoch_durations__isnull=False).values_list(
+            'evaluation_id', 'evaluation__signature', 'evaluation__command', 'session', 'seed', 'completed_at',
+            'data_prep_time', 'data_final_time', 'data_epoch_durations',
+        )
+        if self.tag:
+            experiments = experiments.filter(evaluation__tags__name=self.tag)
+
+        dimensions, keys = dict(), dict()
+        runs, groups, recent, prep, final, durations, epochs = [], [], [], [], [], [], []
+        for evaluation_id, signature, command, session, seed, completed_at, prep_time, final_time, epoch_durations \
+                in experiments.iterator(chunk_size=chunk_size):
+            if evaluation_id not in dimensions:
+                dims = get_dimensions(command)
+                dimensions[evaluation_id] = tuple(dims.get(key) for key in GROUP_BY) if self.match(dims) else None
+            key = dimensions[evaluation_id]
+            epoch_durations = handler.json_loads(epoch_durations)
+            if key is None or not epoch_durations:
+                continue
+
+            runs.append(dict(signature=signature, session=session, seed=seed, completed_at=completed_at))
+            groups.append(keys.setdefault(key, len(keys)))
+            recent.append(completed_at is not None and completed_at >= self.since)
+            prep.append(prep_time or 0)
+            final.append(final_time or 0)
+            durations.extend(epoch_durations)
+            epochs.append(len(epoch_durations))
+
+        return dict(
+            keys=list(keys),
+            runs=runs,
+            groups=np.asarray(groups, dtype=int),
+            recent=np.asarray(recent, dtype=bool),
+            prep=np.asarray(prep, dtype=float),
+            final=np.asarray(final, dtype=float),
+            durations=np.asarray(durations, dtype=float),
+            epoch_runs=np.repeat(np.arange(len(epochs)), epochs),
+        )
+
+    def analyse(self):
+        data = self.load()
+        keys, runs, groups, recent = data['keys'], data['runs'], data['groups'], data['recent']
+        durations, epoch_runs = data['durations'], data['epoch_runs']
+        n_groups, n_runs = len(keys), len(runs)
+        if not n_runs:
+            return dict(groups=[], regressions=[])
+
+        epoch_groups = groups[epoch_runs]
+        run_counts = np.bincount(groups, minlength=n_groups)
+        epoch_counts = np.bincount(epoch_groups, minlength=n_groups)
+        p50 = grouped_quantile(durations, epoch_groups, n_groups, 0.5)
+        p95 = grouped_quantile(durations, epoch_groups, n_groups, 0.95)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prep_share = np.bincount(groups, data['prep'], n_groups) / np.bincount(groups, data['final'], n_groups)
+
+        run_median = grouped_quantile(durations, epoch_runs, n_runs, 0.5)
+
+        # 基线：各组内时间窗口之前完成的运行
+        baseline = ~recent
+        baseline_runs = np.bincount(groups[baseline], minlength=n_groups)
+        baseline_median = grouped_quantile(run_median[baseline], groups[baseline], n_groups, 0.5)
+        deviation = np.abs(run_median - baseline_median[groups])
+        baseline_mad = grouped_quantile(deviation[baseline], groups[baseline], n_groups, 0.5) * MAD_SCALE
+        baseline_epochs = baseline[epoch_runs]
+        baseline_p95 = grouped_quantile(durations[baseline_epochs], epoch_groups[baseline_epochs], n_groups, 0.95)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slowdown = run_median / baseline_median[groups]
+            z = (run_median - baseline_median[groups]) / baseline_mad[groups]
+        # MAD 为 0（基线完全一致）时只看相对阈值
+        z = np.where(baseline_mad[groups] > 0, z, np.where(slowdown > 1, np.inf, 0.))
+        slow_epochs = np.bincount(epoch_runs, durations > baseline_p95[epoch_groups], n_runs).astype(int)
+        flagged = recent & (baseline_runs[groups] >= self.min_baseline) & (slowdown > 1 + self.threshold) & (z > self.z)
+        flagged = np.flatnonzero(flagged)
+        flagged = flagged[np.argsort(-slowdown[flagged], kind='stable')]
+
+        return dict(
+            groups=[
+                dict(
+                    zip(GROUP_BY, key),
+                    experiments=int(run_counts[index]),
+                    epochs=int(epoch_counts[index]),
+                    epoch_p50=_float(p50[index]),
+                    epoch_p95=_float(p95[index]),
+                    prep_share=_float(prep_share[index]),
+                    baseline_experiments=int(baseline_runs[index]),
+                    baseline_epoch_p50=_float(baseline_median[index]),
+                )
+                for index, key in enumerate(keys)
+            ],
+            regressions=[
+                dict(
+                    runs[index],
+                    **dict(zip(GROUP_BY, keys[groups[index]])),
+                    epoch_median=_float(run_median[index]),
+                    baseline_epoch_median=_float(baseline_median[groups[index]]),
+                    slowdown=_float(slowdown[index]),
+                    z=None if np.isinf(z[index]) else _float(z[index]),
+                    slow_epochs=int(slow_epochs[index]),
+                )
+                for index in flagged
+            ],
+        )
@@ -10,6 +10,12 @@ class EvaluationErrors:
     EVALUATION_CREATION = Error('Evaluation creation failed', code=Code.InternalServerError)
     ALREADY_COMPLETED = Error('Experiment already completed', code=Code.BadRequest)
     EMPTY_QUERY = Error('Empty query', code=Code.BadRequest)
+    RENDERER_NOT_FOUND = Error('Export format not supported', code=Code.BadRequest)
+    RENDERER_UNAVAILABLE = Error('Export format requires an optional dependency that is not installed', code=Code.NotImplemented)
+    REPORT_AGGREGATION = Error('Unknown report aggregation', code=Code.BadRequest)
+    INVALID_FILTERS = Error('Filters must be comma-separated key:value pairs', code=Code.BadRequest)
+    COMPARISON_TOO_FEW = Error('At least two signatures are required for comparison', code=Code.BadRequest)
+    COMPARISON_DUPLICATE = Error('Signatures to compare must be distinct', code=Code.BadRequest)
 
 
 class EvaluationValidator:
@@ -1,13 +1,75 @@
 # ignore_security_alert_file SQL_INJECTION
 from django.core.paginator import Paginator
+from django.db.models import Prefetch, Count
+from django.utils.http import http_date
 from django.views import View
+from oba import raw
 from smartdjango import analyse, Validator, OK
 from smartdjango.analyse import Request
 
 from common import auth
-from evaluation.export import get_top_rank_models_per_datasets, get_total_running_hours
-from evaluation.models import Evaluation, Experiment
-from evaluation.params import EvaluationParams, ExperimentParams
+from common.conditional import conditional, make_etag
+from common.middleware import APIPacker
+from common.routers import use_analytics, read_live
+from evaluation.compare import compare_evaluations
+from evaluation.dedup import find_duplicates
+from evaluation.export import get_total_running_hours, get_top_rank_table, get_top_rank_rows, get_results, METRICS
+from evaluation.models import Evaluation, Experiment, Tag, Job
+from evaluation.params import EvaluationParams, ExperimentParams, TagParams, FILTERS
+from evaluation.renderers import get_renderer
+from evaluation.report import Report
+from evaluation.snapshots import get_leaderboard, get_served_snapshot, get_snapshot_params
+from evaluation.throughput import Throughput
+
+
+def get_export_version(request):
+    etag, last_modified = Experiment.get_results_version()
+    return make_etag(etag, request.path, sorted(request.GET.items())), last_modified
+
+
+def get_tag_version(request):
+    etag, last_modified = get_export_version(request)
+    return make_etag(etag, Tag.get_membership_version(request.argument.name)), last_modified
+
+
+def get_leaderboard_params(request):
+    return dict(
+        replicate=request.query.replicate,
+        metrics=raw(request.query.metrics),
+        datasets=raw(request.query.datasets),
+        top_k=request.query.top_k,
+        live=request.query.live,
+        tiebreak=raw(request.query.tiebreak),
+        per_model=bool(request.query.per_model),
+        with_ties=bool(request.query.with_ties),
+    )
+
+
+def get_leaderboard_version(request):
+    # 快照可能落后于实时结果，ETag 必须来自实际返回的快照
+    if request.query.scenario == 'get_top_rank_models_per_datasets':
+        snapshot = get_served_snapshot(**get_leaderboard_params(request))
+        if snapshot is not None:
+            etag = make_etag(
+                'snapshot', snapshot.pk, snapshot.version, snapshot.created_at.timestamp(),
+                request.path, sorted(request.GET.items()),
+            )
+            return etag, snapshot.created_at
+        params = get_leaderboard_params(request)
+        if not (params['tiebreak'] or params['per_model'] or params['with_ties']) and get_snapshot_params(
+                params['replicate'], params['metrics'], params['datasets'], params['top_k']) is not None:
+            # 配置的快照缺失时由 compute_snapshot 从主库计算
+            with read_live():
+                return get_export_version(request)
+    return get_export_version(request)
+
+
+def set_snapshot_headers(response, snapshot):
+    if snapshot is None:
+        return response
+    response['Age'] = str(int(snapshot.get_age()))
+    response['X-Snapshot-Created'] = http_date(snapshot.created_at.timestamp())
+    return response
 
 
 class EvaluationView(View):
@@ -16,6 +78,7 @@ class EvaluationView(View):
         Validator('page').default(1).to(int).to(lambda x: max(x, 1)),
         Validator('page_size').default(50).to(int).to(lambda x: min(max(x, 10), 100))
     )
+    @conditional(lambda request: request.argument.signature and Evaluation.get_version(request.argument.signature))
     def get(self, request: Request, *args, **kwargs):
         signature = request.argument.signature
         if signature:
@@ -23,7 +86,9 @@ class EvaluationView(View):
             return evaluation.json()
 
         # return [evaluation.jsonl() for evaluation in Evaluation.objects.all()]
-        evaluations = Evaluation.objects.all()
+        evaluations = Evaluation.objects.order_by('pk').prefetch_related(
+            Prefetch('experiment_set', queryset=Experiment.objects.defer('log')),
+        )
         paginator = Paginator(evaluations, request.query.page_size)
         page = request.query.page if request.query.page <= paginator.num_pages else paginator.num_pages
         current_page = paginator.page(page)
@@ -56,12 +121,48 @@ class EvaluationView(View):
         return OK
 
 
+class CompareView(View):
+    @use_analytics
+    @analyse.query(
+        Validator('signatures').to(lambda x: x.split(',')),
+        Validator('metrics').default(None, as_final=True).to(lambda x: x.split(',')),
+        Validator('n_boot').default(1000).to(int).to(lambda x: min(max(x, 100), 10000)),
+        Validator('confidence').default(0.95).to(float).bool(lambda x: 0 < x < 1, message='confidence must be in (0, 1)'),
+        Validator('seed').default(0).to(int),
+    )
+    @conditional(get_export_version)
+    def get(self, request: Request):
+        return compare_evaluations(
+            signatures=raw(request.query.signatures),
+            metrics=raw(request.query.metrics),
+            n_boot=request.query.n_boot,
+            confidence=request.query.confidence,
+            seed=request.query.seed,
+        )
+
+
+class DuplicatesView(View):
+    @use_analytics
+    @analyse.query(
+        Validator('tag').default(None, as_final=True),
+        Validator('ignore').default(None, as_final=True).to(lambda x: x.split(',')),
+    )
+    def get(self, request: Request):
+        evaluations = None
+        if request.query.tag:
+            with read_live():
+                tag = Tag.get_by_name(request.query.tag)
+            evaluations = tag.evaluations.all()
+        return find_duplicates(evaluations, ignore=raw(request.query.ignore) or ())
+
+
 class ExperimentView(View):
     @analyse.query(
         ExperimentParams.session.copy().default(None, as_final=True),
         ExperimentParams.seed.copy().default(None, as_final=True).to(int),
         EvaluationParams.signature.copy().default(None, as_final=True)
     )
+    @conditional(lambda request: Experiment.get_version(request.query.session, request.query.signature, request.query.seed))
     def get(self, request: Request, **kwargs):
         session = request.query.session
         signature, seed = request.query.signature, request.query.seed
@@ -103,12 +204,31 @@ class ExperimentRegisterView(View):
         return experiment.json()
 
 
+class ExperimentHeartbeatView(View):
+    @analyse.argument(ExperimentParams.session)
+    @auth.require_login
+    def post(self, request: Request, **kwargs):
+        Experiment.heartbeat(request.argument.session)
+        return OK
+
+
+class PendingSeedsView(View):
+    @analyse.query(
+        EvaluationParams.signature,
+        Validator('seeds').default(None, as_final=True).to(lambda x: [int(seed) for seed in x.split(',')]),
+    )
+    def get(self, request: Request):
+        evaluation = Evaluation.get_by_signature(request.query.signature)
+        return Experiment.get_seed_status(evaluation, seeds=raw(request.query.seeds))
+
+
 class LogView(View):
     @analyse.query(
         ExperimentParams.session.copy().default(None, as_final=True),
         ExperimentParams.seed.copy().default(None, as_final=True).to(int),
         EvaluationParams.signature.copy().default(None, as_final=True)
     )
+    @conditional(lambda request: Experiment.get_version(request.query.session, request.query.signature, request.query.seed))
     def get(self, request: Request):
         session = request.query.session
         signature, seed = request.query.signature, request.query.seed
@@ -117,91 +237,196 @@ class LogView(View):
 
 
 class LogSummarizeView(View):
+    @auth.require_login
     def get(self, request: Request):
-        for experiment in Experiment.objects.all():
-            experiment.summarize()
-        return OK
+        sessions = Experiment.objects.filter(is_completed=True, data_final_time__isnull=True).values_list('session', flat=True)
+        return dict(enqueued=Job.enqueue_many(Job.SUMMARIZE, sessions.iterator()))
+
+
+class JobView(View):
+    @analyse.query(
+        Validator('status').default(None, as_final=True),
+        Validator('limit').default(50).to(int).to(lambda x: min(max(x, 1), 500)),
+    )
+    def get(self, request: Request):
+        jobs = Job.objects.order_by('-pk')
+        if request.query.status:
+            jobs = jobs.filter(status=request.query.status)
+        return dict(
+            counts=Job.get_counts(),
+            jobs=[job.json() for job in jobs[:request.query.limit]],
+        )
 
 
 class ExportView(View):
+    @use_analytics(unless=lambda request: request.GET.get('live') not in (None, '', '0'))
     @analyse.query(
-        Validator('replicate').default(5, as_final=True),
+        Validator('replicate').default(5).to(int),
         Validator('metrics').default(None, as_final=True).to(lambda x: x.split(',')),
         Validator('datasets').default(None, as_final=True).to(lambda x: x.split(',')),
         Validator('scenario').default('get_top_rank_models_per_datasets', as_final=True),
         Validator('top_k').default(1, as_final=True).to(int),
         Validator('return_table').default(0, as_final=True).to(int),
+        Validator('format').default(None, as_final=True),
+        Validator('live').default(0, as_final=True).to(int),
+        Validator('tiebreak').default(None, as_final=True).to(lambda x: x.split(',')),
+        Validator('per_model').default(0, as_final=True).to(int),
+        Validator('with_ties').default(0, as_final=True).to(int),
     )
+    @conditional(get_leaderboard_version)
     def get(self, request: Request):
         replicate = request.query.replicate
-        metrics = request.query.metrics()
-        datasets = request.query.datasets()
+        metrics = raw(request.query.metrics)
+        datasets = raw(request.query.datasets)
+        export_format = request.query.format
 
         scenario = request.query.scenario
         if scenario == 'get_top_rank_models_per_datasets':
-            return get_top_rank_models_per_datasets(replicate, metrics, datasets, top_k=request.query.top_k, return_table=request.query.return_table)
+            top_k = request.query.top_k
+            results, snapshot = get_leaderboard(**get_leaderboard_params(request))
+            if export_format == 'latex':
+                header, rows = get_top_rank_table(results, metrics or METRICS, top_k)
+                response = get_renderer('latex', header[-1], header=header).response(rows, filename=scenario)
+            elif export_format:
+                columns, rows, types = get_top_rank_rows(results, metrics or METRICS)
+                response = get_renderer(export_format, columns, types=types).response(rows, filename=scenario)
+            elif request.query.return_table:
+                header, rows = get_top_rank_table(results, metrics or METRICS, top_k)
+                table = get_renderer('latex', header[-1], header=header).render_to_string(rows)
+                response = APIPacker.pack(table, request)
+            else:
+                response = APIPacker.pack(results, request)
+            return set_snapshot_headers(response, snapshot)
         if scenario == 'get_total_running_hours':
             return get_total_running_hours()
+        if scenario == 'get_results':
+            columns, rows, types = get_results(replicate, metrics, datasets)
+            return get_renderer(export_format or 'json', columns, types=types).response(rows, filename=scenario)
+
+        return OK
+
+
+def get_report(request, rows='model', columns=None, tag=None):
+    report = Report(
+        rows=raw(request.query.rows) or rows.split(','),
+        columns=raw(request.query.columns) or (columns and columns.split(',')),
+        metrics=raw(request.query.metrics),
+        aggregate=request.query.aggregate,
+        replicate=request.query.replicate,
+        filters=raw(request.query.filters),
+        rank_by=request.query.rank_by,
+        tag=tag,
+    )
+    export_format = request.query.format
+    if not export_format:
+        return report.json()
+
+    columns, rows, types = report.tabulate(pretty=export_format == 'latex')
+    return get_renderer(export_format, columns, types=types).response(rows, filename=tag or 'report')
+
+
+REPORT_QUERY = (
+    Validator('rows').default(None, as_final=True).to(lambda x: x.split(',')),
+    Validator('columns').default(None, as_final=True).to(lambda x: x.split(',')),
+    Validator('metrics').default(None, as_final=True).to(lambda x: x.split(',')),
+    Validator('aggregate').default('best', as_final=True),
+    Validator('replicate').default(5).to(int),
+    FILTERS,
+    Validator('rank_by').default(None, as_final=True),
+    Validator('format').default(None, as_final=True),
+)
+
+
+class ReportView(View):
+    @use_analytics
+    @analyse.query(*REPORT_QUERY)
+    @conditional(get_export_version)
+    def get(self, request: Request):
+        return get_report(request)
+
+
+class ThroughputView(View):
+    @use_analytics
+    @analyse.query(
+        Validator('days').default(7).to(int).bool(lambda x: x > 0, message='days must be positive'),
+        Validator('threshold').default(0.2).to(float).bool(lambda x: x >= 0, message='threshold must be non-negative'),
+        Validator('z').default(3.).to(float),
+        Validator('min_baseline').default(3).to(int).to(lambda x: max(x, 1)),
+        Validator('tag').default(None, as_final=True),
+        FILTERS,
+    )
+    def get(self, request: Request):
+        return Throughput(
+            days=request.query.days,
+            threshold=request.query.threshold,
+            z=request.query.z,
+            min_baseline=request.query.min_baseline,
+            tag=request.query.tag,
+            filters=raw(request.query.filters),
+        ).analyse()
+
+
+class TagView(View):
+    @analyse.argument(TagParams.name.copy().default(None, as_final=True))
+    def get(self, request: Request, **kwargs):
+        name = request.argument.name
+        if name:
+            return Tag.get_by_name(name).json()
 
+        tags = Tag.objects.annotate(evaluation_count=Count('evaluations')).order_by('name')
+        return [tag.jsonl() for tag in tags]
+
+    @analyse.json(TagParams.name)
+    @auth.require_login
+    def post(self, request: Request):
+        return Tag.create_or_get(request.json.name).json()
+
+    @analyse.argument(TagParams.name)
+    @auth.require_login
+    def delete(self, request: Request, **kwargs):
+        Tag.remove(request.argument.name)
         return OK
 
-        # selected_evaluations = []
-        # for evaluation in Evaluation.objects.all():
-        #     experiments = Experiment.objects.filter(evaluation=evaluation, is_completed=True)
-        #     if experiments.count() >= replicate:
-        #         selected_evaluations.append(evaluation)
-        #
-        # evaluations = [evaluation.jsonl4export() for evaluation in selected_evaluations]
-        #
-        # models = ['dnn', 'pnn', 'deepfm', 'dcn', 'dcnv2', 'din', 'autoint', 'finalmlp', 'gdcn', 'masknet']
-        # pretty_models = {
-        #     'dnn': 'DNN',
-        #     'pnn': 'PNN',
-        #     'deepfm': 'DeepFM',
-        #     'dcn': 'DCN',
-        #     'dcnv2': 'DCNv2',
-        #     'din': 'DIN',
-        #     'autoint': 'AutoInt',
-        #     'finalmlp': 'FinalMLP',
-        #     'gdcn': 'GDCN',
-        #     'masknet': 'MaskNet',
-        # }
-        # use_id = True
-        #
-        # if use_id:
-        #     models = [f'{method}_id' for method in models]
-        #
-        # datasets = ['automotive', 'books', 'cds']
-        # metrics = ['gauc', 'mrr', 'ndcg@1']
-        #
-        # table = dict()
-        #
-        # for model in models:
-        #     table[model] = dict()
-        #     for dataset in datasets:
-        #         table[model][dataset] = dict()
-        #
-        # for evaluation in evaluations:
-        #     model_name = evaluation['params']['model'].lower()
-        #     data_name = evaluation['params']['data'].lower()
-        #     performance = {k.lower(): v for k, v in evaluation['performance'].items()}
-        #
-        #     if model_name in models and data_name in datasets:
-        #         for metric in metrics:
-        #             table[model_name][data_name][metric] = performance[metric]
-        #
-        # lines = []
-        # for model in models:
-        #     model_name = model.split('_id')[0] if use_id else model
-        #     model_name = pretty_models[model_name]
-        #     if use_id:
-        #         model_name = f'{model_name}' + '$_\\text{ID}$'
-        #     elements = [model_name]
-        #
-        #     for dataset in datasets:
-        #         for metric in metrics:
-        #             elements.append(table[model][dataset].get(metric, ''))
-        #     string = ' & '.join(elements) + ' \\\\'
-        #     lines.append(string)
-        #
-        # return '\n'.join(lines)
+
+class TagEvaluationsView(View):
+    @analyse.argument(TagParams.name)
+    @analyse.json(TagParams.signatures)
+    @auth.require_login
+    def post(self, request: Request, **kwargs):
+        tag = Tag.create_or_get(request.argument.name)
+        tag.add_evaluations(raw(request.json.signatures))
+        return tag.jsonl()
+
+    @analyse.argument(TagParams.name)
+    @analyse.json(TagParams.signatures)
+    @auth.require_login
+    def delete(self, request: Request, **kwargs):
+        tag = Tag.get_by_name(request.argument.name)
+        tag.remove_evaluations(raw(request.json.signatures))
+        return tag.jsonl()
+
+
+class TagLeaderboardView(View):
+    @use_analytics
+    @analyse.argument(TagParams.name)
+    @analyse.query(*REPORT_QUERY)
+    @conditional(get_tag_version)
+    def get(self, request: Request, **kwargs):
+        with read_live():
+            tag = Tag.get_by_name(request.argument.name)
+        return get_report(request, rows='model', columns='dataset', tag=tag.name)
+
+
+class TagProgressView(View):
+    @analyse.argument(TagParams.name)
+    @analyse.query(Validator('replicate').default(5).to(int))
+    def get(self, request: Request, **kwargs):
+        tag = Tag.get_by_name(request.argument.name)
+        return tag.get_progress(replicate=request.query.replicate)
+
+
+class TagRunningTimeView(View):
+    @analyse.argument(TagParams.name)
+    def get(self, request: Request, **kwargs):
+        tag = Tag.get_by_name(request.argument.name)
+        return tag.get_running_time()